@@ -0,0 +1,38 @@
+"""
+access token 校验吞吐：完整 jwt.decode vs 已校验 token 缓存
+
+运行：python -m benchmarks.bench_auth
+"""
+import time
+
+from cores.auth import AuthHandler
+
+ROUNDS = 20000
+USERS = 100
+
+
+def run(name: str, handler: AuthHandler, tokens: list[str], clear_cache: bool):
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        if clear_cache:
+            handler._token_cache.clear()
+        handler.decode_access_token(tokens[i % len(tokens)])
+    elapsed = time.perf_counter() - start
+    print(f"{name:<8} {ROUNDS / elapsed:10.0f} decodes/s  {elapsed / ROUNDS * 1e6:6.2f} us/decode")
+
+
+def main():
+    handler = AuthHandler()
+    tokens = [handler.encode_login_token(user_id)["access_token"] for user_id in range(USERS)]
+    run("no-cache", handler, tokens, clear_cache=True)
+    run("cache", handler, tokens, clear_cache=False)
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        AuthHandler()
+    elapsed = time.perf_counter() - start
+    print(f"AuthHandler() {elapsed / ROUNDS * 1e9:6.0f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+起名引擎对比：LangChain agent（结构化输出走工具调用） vs fast（一次 JSON 模式调用 + 本地解析）
+
+用一个本地假聊天模型，立即返回结果，所以测出来的就是每次调用框架本身的开销。
+token 数按发给模型的全部内容（消息 + 工具定义）估算，和真实服务商的计费口径接近。
+最后对几种常见的坏 JSON 跑一遍本地修补。
+运行：python -m benchmarks.bench_engines
+"""
+import asyncio
+import json
+import random
+import time
+
+from langchain.agents import create_agent
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from cores import agent
+from cores.llm_router import Backend
+from cores.name_parser import parse_name_result
+from cores.tokens import estimate_tokens, merge_usage
+from schemas.agent import NameResultSchema
+from schemas.name import NameIn
+
+ROUNDS = 300
+# 假模型被调用的次数（pydantic 模型上不方便放类变量）
+model_calls = 0
+
+
+def _names() -> list[dict]:
+    chars = random.sample("子文浩然思雨欣怡嘉宇俊杰梓涵若曦一鸣清扬", 10)
+    return [
+        {"name": "张" + chars[2 * i] + chars[2 * i + 1], "reference": "《诗经·小雅》", "moral": "寓意美好，前程似锦"}
+        for i in range(5)
+    ]
+
+
+class FakeChatModel(BaseChatModel):
+    """绑定了工具就用工具调用返回（agent 的结构化输出），否则直接返回 JSON 文本"""
+
+    tools: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tools": [convert_to_openai_tool(tool) for tool in tools]})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        global model_calls
+        model_calls += 1
+        payload = {"names": _names()}
+        text = json.dumps(payload, ensure_ascii=False)
+        # 工具定义也是 prompt 的一部分，每次调用都要算钱
+        prompt = "".join(message.text for message in messages) + json.dumps(self.tools, ensure_ascii=False)
+        if self.tools:
+            message = AIMessage("", tool_calls=[{"name": self.tools[0]["function"]["name"], "args": payload, "id": "call_0"}])
+        else:
+            message = AIMessage(text)
+        input_tokens = round(estimate_tokens(prompt))
+        output_tokens = round(estimate_tokens(text))
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+async def run(name: str, call) -> None:
+    backend = Backend("fake", FakeChatModel())
+    backend.agents[NameResultSchema] = create_agent(
+        model=backend.llm, system_prompt=agent.system_prompt, response_format=NameResultSchema,
+    )
+    prompt = agent.build_prompt(NameIn(surname="张", gender="男", length="两字", other="温文尔雅"))
+    # 预热一次，排除首次构建的开销
+    global model_calls
+    await call(backend, NameResultSchema, prompt)
+    model_calls = 0
+    input_tokens = output_tokens = 0
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = await call(backend, NameResultSchema, prompt)
+        usage = merge_usage(result["messages"])
+        input_tokens += usage["input_tokens"]
+        output_tokens += usage["output_tokens"]
+        assert len(result["structured_response"].names) == 5
+    elapsed = time.perf_counter() - start
+    print(f"{name:<6} {elapsed / ROUNDS * 1e6:8.0f} us/call  model calls/request {model_calls / ROUNDS:.2f}  "
+          f"input tokens {input_tokens / ROUNDS:6.0f}  output tokens {output_tokens / ROUNDS:6.0f}")
+
+
+def repairs() -> None:
+    good = json.dumps({"names": _names()}, ensure_ascii=False)
+    cases = {
+        "代码块和说明文字": f"好的，以下是结果：\n```json\n{good}\n```",
+        "多余的逗号": good.replace("}]", "},]"),
+        "输出被截断": good[:-40],
+        "字符串里有换行": good.replace("小雅", "小\n雅"),
+    }
+    for name, text in cases.items():
+        start = time.perf_counter()
+        result = parse_name_result(text)
+        elapsed = time.perf_counter() - start
+        count = 0 if result is None else len(result.names)
+        print(f"repair {name:<10} {count} names  {elapsed * 1e6:6.0f} us")
+
+
+async def main():
+    await run("agent", agent._call_agent)
+    await run("fast", agent._call_fast)
+    repairs()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+"""
+离线压测：假模型 + SQLite + 本地 SMTP，不依赖 MySQL、QQ 邮箱和 DeepSeek
+
+场景：
+- login  登录风暴：一批已注册用户并发登录（Argon2 校验是主要开销）
+- code   验证码风暴：大量邮箱并发请求验证码，最后等本地 SMTP 收完
+- name   起名突发：热门组合和长尾组合混合的 /name 请求
+- stream 流式起名：/name/stream 的首个候选延迟和总耗时（直接按 ASGI 调用，才能量到首包时间）
+每个起名响应都会检查确实返回了名字，假模型或者过滤出问题时直接报错，而不是测出一个很快的空结果。
+
+运行：
+    python -m benchmarks.bench_load                 # 全部场景
+    python -m benchmarks.bench_load name stream     # 只跑部分场景
+可以用环境变量调整规模：BENCH_LLM_LATENCY=1.0 BENCH_NAME_REQUESTS=500 ...
+也可以用 BENCH_DB_URI 指向本地 MySQL（会删表重建）。
+"""
+from benchmarks import harness
+
+import asyncio
+import os
+import sys
+import time
+
+LLM_LATENCY = float(os.getenv("BENCH_LLM_LATENCY", "0.5"))
+LLM_TOKEN_RATE = float(os.getenv("BENCH_LLM_TOKEN_RATE", "200"))
+LOGIN_USERS = int(os.getenv("BENCH_LOGIN_USERS", "10"))
+LOGIN_REQUESTS = int(os.getenv("BENCH_LOGIN_REQUESTS", "50"))
+CODE_REQUESTS = int(os.getenv("BENCH_CODE_REQUESTS", "500"))
+NAME_REQUESTS = int(os.getenv("BENCH_NAME_REQUESTS", "300"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "50"))
+PASSWORD = "bench123456"
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗"
+
+
+async def login_storm(http):
+    from repository.user_repo import UserRepository
+    from models import AsyncSessionFactory
+    from schemas.user import UserCreateSchema
+
+    async with AsyncSessionFactory() as session:
+        repo = UserRepository(session)
+        for i in range(LOGIN_USERS):
+            await repo.create_user(UserCreateSchema(
+                email=f"login{i}@bench.com", username="bench", password=PASSWORD,
+            ))
+
+    await harness.run_load("login", lambda i: http.post("/auth/login", json={
+        "email": f"login{i % LOGIN_USERS}@bench.com", "password": PASSWORD,
+    }), LOGIN_REQUESTS, CONCURRENCY)
+
+
+async def code_storm(http, sink: harness.SMTPSink):
+    start = time.perf_counter()
+    await harness.run_load("code", lambda i: http.get("/auth/code", params={
+        "email": f"code{i}@bench.com",
+    }), CODE_REQUESTS, CONCURRENCY)
+    # 接口只负责入队，这里再等后台 worker 把信发完
+    while sink.received < CODE_REQUESTS and time.perf_counter() - start < 60:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    print(f"{'code mail':<12} {sink.received} delivered in {elapsed:.1f}s ({sink.received / elapsed:.0f} mails/s)")
+
+
+def _name_body(i: int) -> dict:
+    # 八成请求落在 5 个热门组合上，剩下的是长尾
+    surname = SURNAMES[i % 5] if i % 10 < 8 else SURNAMES[i % len(SURNAMES)]
+    return {"surname": surname, "gender": "男" if i % 2 else "女", "length": "两字", "other": "", "exclude": []}
+
+
+async def name_burst(http, llm: harness.FakeLLM, headers_for):
+    calls = llm.calls
+
+    async def one(i: int):
+        response = await http.post("/name", json=_name_body(i), headers=headers_for(i))
+        if response.status_code == 200:
+            names = response.json()["names"]
+            assert len(names) == 5, response.text
+            assert all(item["name"].startswith(_name_body(i)["surname"]) for item in names), response.text
+        return response
+
+    await harness.run_load("name", one, NAME_REQUESTS, CONCURRENCY)
+    print(f"{'name llm':<12} {llm.calls - calls} model calls for {NAME_REQUESTS} requests")
+
+
+async def stream_burst(app, headers_for):
+    first: list[float] = []
+
+    async def one(i: int):
+        start = time.perf_counter()
+        seen = False
+
+        def on_chunk(chunk: bytes) -> None:
+            nonlocal seen
+            if not seen and b"event: candidate" in chunk:
+                seen = True
+                first.append(time.perf_counter() - start)
+
+        # other 各不相同，每个请求都要真正调用模型
+        body = _name_body(i) | {"other": f"第{i}个"}
+        response = await harness.asgi_stream(app, "POST", "/name/stream", body, headers_for(i), on_chunk)
+        if response.status_code == 200:
+            # 流式不做补充生成，被过滤掉的不会补上，至少要有一个
+            assert "event: candidate" in response.text, response.text
+        return response
+
+    await harness.run_load("stream", one, min(NAME_REQUESTS, 100), CONCURRENCY)
+    if first:
+        first.sort()
+        print(f"{'stream ttfc':<12} p50 {first[len(first) // 2] * 1000:7.1f}ms  "
+              f"p95 {first[int(len(first) * 0.95)] * 1000:7.1f}ms (first candidate)")
+
+
+async def main(scenarios: list[str]):
+    app = harness.load_app()
+    from cores.auth import auth_handler
+
+    await harness.reset_db()
+    llm = harness.install_fake_llm(LLM_LATENCY, LLM_TOKEN_RATE)
+    # 每个用户一个 token，模拟 100 个不同的用户
+    tokens = [auth_handler.encode_login_token(user_id)["access_token"] for user_id in range(100)]
+
+    def headers_for(i: int) -> dict:
+        return {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+
+    with harness.SMTPSink() as sink:
+        async with harness.client(app) as http:
+            if "login" in scenarios:
+                await login_storm(http)
+            if "code" in scenarios:
+                await code_storm(http, sink)
+            if "name" in scenarios:
+                await name_burst(http, llm, headers_for)
+            if "stream" in scenarios:
+                await stream_burst(app, headers_for)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:] or ["login", "code", "name", "stream"]))
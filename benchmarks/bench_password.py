@@ -0,0 +1,67 @@
+"""
+登录吞吐对比：同步 Argon2 校验 vs 线程池异步校验
+
+模拟 login 接口：一次数据库查询（用 sleep 模拟 IO）+ 一次密码校验，
+并发 CONCURRENCY 个请求，统计 RPS 和事件循环延迟。
+
+运行：python -m benchmarks.bench_password
+"""
+import asyncio
+import time
+
+from cores.password import PasswordService, password_hash
+
+REQUESTS = 40
+CONCURRENCY = 20
+DB_LATENCY = 0.002
+PASSWORD = "123456"
+
+
+async def login_sync(hashed: str):
+    await asyncio.sleep(DB_LATENCY)
+    return password_hash.verify(PASSWORD, hashed)
+
+
+def make_login_async(service: PasswordService):
+    async def login_async(hashed: str):
+        await asyncio.sleep(DB_LATENCY)
+        return await service.verify(PASSWORD, hashed)
+    return login_async
+
+
+async def measure_lag(stop: asyncio.Event, lags: list[float]):
+    # 每 10ms 醒一次，实际多睡了多久就是事件循环被阻塞的时间
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - start - 0.01)
+
+
+async def run(name: str, login, hashed: str):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one():
+        async with semaphore:
+            assert await login(hashed)
+
+    stop = asyncio.Event()
+    lags: list[float] = []
+    lag_task = asyncio.create_task(measure_lag(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(REQUESTS)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+    print(f"{name:<8} rps={REQUESTS / elapsed:8.1f}  "
+          f"loop_lag_max={max(lags, default=0) * 1000:7.1f}ms")
+
+
+async def main():
+    hashed = password_hash.hash(PASSWORD)
+    service = PasswordService(max_workers=4)
+    await run("sync", login_sync, hashed)
+    await run("pool", make_login_async(service), hashed)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+限流的开销：单次计数的耗时，以及挂在接口上以后每个请求多花的时间
+
+- memory：进程内滑动窗口（1 个 key / 大量不同 key）
+- kv：走 KVStore（这里用进程内的 MemoryKVStore，换成 Redis 后还要加上网络往返）
+- 接口：同一个空接口，不挂限流 / 挂一条按 IP 限流 / 按 IP + 按邮箱两条，用 ASGITransport 直接调用
+
+运行：python -m benchmarks.bench_rate_limit
+"""
+import os
+
+os.environ.setdefault("APP_ENV", "test")
+os.environ["RATE_LIMIT_ENABLED"] = "true"
+
+import asyncio
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+
+from cores.cache import MemoryKVStore
+from cores.rate_limit import RateLimiter, by_email, by_ip
+
+HITS = 100000
+REQUESTS = 3000
+# 限额给足，测的是放行路径的开销
+LIMIT = 10 ** 9
+
+
+async def bench_hits(name: str, limiter: RateLimiter, keys: int) -> None:
+    labels = [f"user{i}@example.com" for i in range(keys)]
+    start = time.perf_counter()
+    for i in range(HITS):
+        await limiter.hit(labels[i % keys])
+    elapsed = time.perf_counter() - start
+    print(f"{name:<18} {elapsed / HITS * 1e6:6.2f} us/hit  tracked keys {len(limiter.counter)}")
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    ip_limiter = RateLimiter("bench_ip", LIMIT, 60)
+    email_limiter = RateLimiter("bench_email", LIMIT, 60)
+
+    @app.get("/plain")
+    async def plain(email: str):
+        return {"ok": True}
+
+    @app.get("/ip", dependencies=[Depends(by_ip(ip_limiter))])
+    async def limited_ip(email: str):
+        return {"ok": True}
+
+    @app.get("/ip_email", dependencies=[Depends(by_ip(ip_limiter)), Depends(by_email(email_limiter))])
+    async def limited_both(email: str):
+        return {"ok": True}
+
+    return app
+
+
+async def bench_requests() -> None:
+    app = build_app()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        baseline = None
+        for path in ("/plain", "/ip", "/ip_email"):
+            # 预热
+            for i in range(100):
+                await http.get(path, params={"email": f"u{i}@x.com"})
+            start = time.perf_counter()
+            for i in range(REQUESTS):
+                await http.get(path, params={"email": f"u{i % 1000}@x.com"})
+            per_request = (time.perf_counter() - start) / REQUESTS
+            baseline = baseline or per_request
+            print(f"GET {path:<10} {per_request * 1e6:7.1f} us/request  overhead {(per_request - baseline) * 1e6:+6.1f} us")
+
+
+async def main():
+    await bench_hits("memory 1 key", RateLimiter("one", LIMIT, 60), 1)
+    await bench_hits("memory 50k keys", RateLimiter("many", LIMIT, 60), 50000)
+    await bench_hits("kv 50k keys", RateLimiter("kv", LIMIT, 60, backend=MemoryKVStore()), 50000)
+    await bench_requests()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
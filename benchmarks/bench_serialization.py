@@ -0,0 +1,126 @@
+"""
+响应序列化：/name、/auth/login、/auth/register 三种响应，每种对比三种写法的单个请求耗时
+
+- validate：原来的写法（重新构造 NameOut / 返回带 ORM 对象的 dict），FastAPI 按 response_model 再校验一遍
+- construct：model_construct 构造，仍然由 FastAPI 按 response_model 处理
+- fast：model_construct + FastJSONResponse，直接返回序列化好的响应（FAST_JSON_RESPONSES=true 时的路径）
+
+用最小的 ASGI 调用直接跑 app，不经过 HTTP 客户端，差值就是每个响应省下的 CPU 时间。
+运行：python -m benchmarks.bench_serialization
+"""
+import os
+
+os.environ.setdefault("APP_ENV", "test")
+
+import asyncio
+import time
+
+from fastapi import FastAPI
+
+from cores.responses import FastJSONResponse
+from models.user import User
+from schemas import ResponseOut
+from schemas.agent import NameSchema
+from schemas.name import NameOut
+from schemas.user import UserLogOut, UserSchema
+
+ROUNDS = 5000
+
+NAMES = [
+    NameSchema(name=f"张{chars}", reference="《诗经·小雅·鹿鸣》", moral="寓意美好，品行端正，前程似锦")
+    for chars in ("子文", "浩然", "思远", "嘉宇", "一鸣")
+]
+USER = User(id=1, email="someone@example.com", username="someone", _password="x")
+TOKEN = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCIsImtpZCI6InYxIn0." + "x" * 120
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/name/validate", response_model=NameOut)
+    async def name_validate():
+        return NameOut(names=NAMES)
+
+    @app.get("/name/construct", response_model=NameOut)
+    async def name_construct():
+        return NameOut.model_construct(names=NAMES)
+
+    @app.get("/name/fast", response_model=NameOut)
+    async def name_fast():
+        return FastJSONResponse(NameOut.model_construct(names=NAMES))
+
+    @app.get("/login/validate", response_model=UserLogOut)
+    async def login_validate():
+        return {"user": USER, "token": TOKEN}
+
+    def login_out() -> UserLogOut:
+        return UserLogOut.model_construct(
+            user=UserSchema.model_construct(id=USER.id, email=USER.email, username=USER.username),
+            token=TOKEN,
+        )
+
+    @app.get("/login/construct", response_model=UserLogOut)
+    async def login_construct():
+        return login_out()
+
+    @app.get("/login/fast", response_model=UserLogOut)
+    async def login_fast():
+        return FastJSONResponse(login_out())
+
+    @app.get("/register/validate", response_model=ResponseOut)
+    async def register_validate():
+        return ResponseOut()
+
+    @app.get("/register/fast", response_model=ResponseOut)
+    async def register_fast():
+        return FastJSONResponse(ResponseOut())
+
+    return app
+
+
+async def call(app: FastAPI, path: str) -> bytes:
+    """最小的一次 ASGI 调用，返回响应体"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def main():
+    app = build_app()
+    for endpoint, variants in (
+        ("name", ("validate", "construct", "fast")),
+        ("login", ("validate", "construct", "fast")),
+        ("register", ("validate", "fast")),
+    ):
+        bodies = set()
+        baseline = None
+        for variant in variants:
+            path = f"/{endpoint}/{variant}"
+            for _ in range(200):
+                await call(app, path)
+            start = time.perf_counter()
+            for _ in range(ROUNDS):
+                body = await call(app, path)
+            per_request = (time.perf_counter() - start) / ROUNDS
+            bodies.add(body)
+            baseline = baseline or per_request
+            print(f"{path:<20} {per_request * 1e6:7.1f} us/request  {(baseline - per_request) * 1e6:+6.1f} us saved")
+        # 几种写法输出的 JSON 必须一模一样
+        assert len(bodies) == 1, bodies
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""
+冷启动：导入耗时分析 + 从启动进程到 lifespan 启动完成（可以接收请求）的时间
+
+- 用 python -X importtime 导入 main，列出 main 直接导入的模块里最慢的几个，以及自身耗时最多的模块
+- 启动 ROUNDS 个新进程，每个都 import main 并跑完 lifespan 的启动部分，取中位数
+- 中位数超过 BENCH_COLD_START_BUDGET 秒时以非 0 退出，可以放进 CI
+
+运行：python -m benchmarks.bench_startup
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROUNDS = int(os.getenv("BENCH_STARTUP_ROUNDS", "5"))
+BUDGET = float(os.getenv("BENCH_COLD_START_BUDGET", "2.0"))
+TOP = 12
+
+# 子进程里跑：导入 app，跑完 lifespan 启动就退出（不等后台预加载和关闭流程）
+_READY_SCRIPT = """
+import asyncio, os
+from main import app
+
+async def ready():
+    async with app.router.lifespan_context(app):
+        print("ready", flush=True)
+        os._exit(0)
+
+asyncio.run(ready())
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("APP_ENV", "test")
+    # 不依赖本地 MySQL：启动时只创建 engine，不会真的连接
+    env.setdefault("DB_URI", "sqlite+aiosqlite:////tmp/bench_startup.db")
+    return env
+
+
+def import_profile() -> None:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True, env=_env(), check=True,
+    )
+    rows = []
+    # 每行的格式：import time:  自身耗时 | 累计耗时 | 缩进表示层级的模块名（第一行是表头）
+    for line in result.stderr.splitlines()[1:]:
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    # 子模块先输出、父模块后输出：main 前面、到上一个顶层模块为止的第一层就是 main 直接导入的
+    def level(name: str) -> int:
+        return (len(name) - len(name.lstrip()) - 1) // 2
+
+    index = next(i for i, row in enumerate(rows) if row[2].strip() == "main")
+    direct = []
+    for row in reversed(rows[:index]):
+        if level(row[2]) == 0:
+            break
+        if level(row[2]) == 1:
+            direct.append(row)
+    print(f"import main: {rows[index][1] / 1000:.0f}ms")
+    print("main 直接导入的模块（累计）：")
+    for _, cumulative, name in sorted(direct, key=lambda row: -row[1])[:TOP]:
+        print(f"  {cumulative / 1000:7.1f}ms  {name.strip()}")
+    print("自身耗时最多的模块：")
+    for self_us, _, name in sorted(rows, key=lambda row: -row[0])[:TOP]:
+        print(f"  {self_us / 1000:7.1f}ms  {name.strip()}")
+
+
+def cold_start() -> float:
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", _READY_SCRIPT], stdout=subprocess.PIPE, text=True, env=_env(),
+    )
+    line = process.stdout.readline()
+    elapsed = time.perf_counter() - start
+    process.wait()
+    if line.strip() != "ready":
+        raise RuntimeError("子进程没有启动成功")
+    return elapsed
+
+
+def main() -> int:
+    import_profile()
+    samples = [cold_start() for _ in range(ROUNDS)]
+    median = statistics.median(samples)
+    print(f"cold start (进程启动到 lifespan 就绪) median {median * 1000:.0f}ms  "
+          f"min {min(samples) * 1000:.0f}ms  max {max(samples) * 1000:.0f}ms  budget {BUDGET * 1000:.0f}ms")
+    if median > BUDGET:
+        print("超出冷启动预算")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
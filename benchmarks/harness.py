@@ -0,0 +1,319 @@
+"""
+离线压测用的本地替身：假模型、SQLite、本地 SMTP 收信端、事件循环延迟监控和并发压测工具
+
+导入这个模块会先设置环境变量（APP_ENV=test、SQLite、本地 SMTP 端口），
+所以要在导入 main / settings / cores 之前导入：
+    from benchmarks import harness
+    app = harness.load_app()
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import time
+from collections import Counter as StatusCounter
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+
+import httpx
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+SMTP_PORT = _free_port()
+os.environ.setdefault("APP_ENV", "test")
+os.environ.setdefault("DB_URI", os.getenv("BENCH_DB_URI", "sqlite+aiosqlite:////tmp/bench_load.db"))
+os.environ.setdefault("KV_URL", "memory://")
+# 压测是单进程，验证码可以放在进程内的 KV 里
+os.environ.setdefault("CODE_STORE_BACKEND", "kv")
+os.environ["MAIL_SERVER"] = "127.0.0.1"
+os.environ["MAIL_PORT"] = str(SMTP_PORT)
+os.environ["MAIL_STARTTLS"] = "false"
+os.environ["MAIL_SSL_TLS"] = "false"
+# 压测时不要让限流先把请求挡掉
+os.environ.setdefault("LLM_RATE_PER_SECOND", "1000")
+os.environ.setdefault("LLM_BURST", "1000")
+os.environ.setdefault("LLM_MAX_CONCURRENCY", "64")
+os.environ.setdefault("LLM_MAX_QUEUE", "10000")
+os.environ.setdefault("LLM_MAX_QUEUE_PER_USER", "10000")
+# 所有请求都来自同一个地址，限流的开销单独用 bench_rate_limit 测
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+
+class FakeLLM:
+    """
+    假的聊天模型：先等 latency 秒（首 token 延迟，按对数正态抖动），再按 token_rate 个/秒输出。
+    输出 5 个名字，姓取自 prompt（批量时每组各自的姓），token 数按字符数粗略估计。
+    """
+
+    def __init__(self, latency: float = 1.0, token_rate: float = 50, jitter: float = 0.25):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.jitter = jitter
+        self.calls = 0
+
+    @staticmethod
+    def prompt_of(messages) -> str:
+        return "".join(str(m.get("content", "")) if isinstance(m, dict) else str(m.content) for m in messages)
+
+    @staticmethod
+    def surnames(prompt: str) -> list[str]:
+        """prompt 里按顺序出现的姓：起名是“用户的姓是：X”，补充生成是“姓：X”"""
+        return re.findall(r"姓是?：([^，\n]+)", prompt) or ["张"]
+
+    def names(self, surname: str = "张") -> list[dict]:
+        chars = random.sample("子文浩然思雨欣怡嘉宇俊杰梓涵若曦一鸣清扬", 10)
+        return [
+            {"name": surname + chars[2 * i] + chars[2 * i + 1], "reference": "《诗经》", "moral": "寓意美好"}
+            for i in range(5)
+        ]
+
+    def usage(self, prompt: str, output: str) -> dict:
+        input_tokens = int(len(prompt) * 0.6) + 600
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": int(len(output) * 0.6),
+            "total_tokens": input_tokens + int(len(output) * 0.6),
+            "input_token_details": {"cache_read": 512},
+        }
+
+    def groups(self, prompt: str) -> dict:
+        return {"groups": [
+            {"index": i, "names": self.names(surname)} for i, surname in enumerate(self.surnames(prompt))
+        ]}
+
+    async def _wait_first_token(self) -> None:
+        self.calls += 1
+        await asyncio.sleep(self.latency * random.lognormvariate(0, self.jitter))
+
+    async def ainvoke(self, messages, **kwargs):
+        await self._wait_first_token()
+        prompt = self.prompt_of(messages)
+        if '"groups"' in prompt:
+            # fast 引擎的批量调用：按 prompt 里的编号分组
+            payload = self.groups(prompt)
+        else:
+            payload = {"names": self.names(self.surnames(prompt)[0])}
+        text = json.dumps(payload, ensure_ascii=False)
+        await asyncio.sleep(len(text) * 0.6 / self.token_rate)
+        return AIMessage(text, usage_metadata=self.usage(prompt, text))
+
+    async def astream(self, messages, **kwargs):
+        await self._wait_first_token()
+        prompt = self.prompt_of(messages)
+        text = json.dumps({"names": self.names(self.surnames(prompt)[0])}, ensure_ascii=False)
+        step = 8
+        for i in range(0, len(text), step):
+            await asyncio.sleep(step * 0.6 / self.token_rate)
+            yield AIMessageChunk(content=text[i:i + step])
+        yield AIMessageChunk(content="", usage_metadata=self.usage(prompt, text))
+
+
+class FakeAgent:
+    """模拟 create_agent(response_format=...) 的返回：structured_response + 带用量的消息"""
+
+    def __init__(self, llm: FakeLLM, response_format: type):
+        self.llm = llm
+        self.response_format = response_format
+
+    async def ainvoke(self, state: dict) -> dict:
+        from schemas.agent import NameResultSchema
+
+        message = await self.llm.ainvoke(state["messages"])
+        if self.response_format is NameResultSchema:
+            structured = NameResultSchema.model_validate_json(message.content)
+        else:
+            # 批量：按 prompt 里的编号分组
+            structured = self.response_format.model_validate(self.llm.groups(self.llm.prompt_of(state["messages"])))
+        return {"messages": [message], "structured_response": structured}
+
+
+def install_fake_llm(latency: float = 1.0, token_rate: float = 50) -> FakeLLM:
+    """把 cores.agent 的模型后端换成假模型"""
+    from cores import agent
+    from cores.llm_router import Backend
+    from schemas.agent import NameBatchResultSchema, NameResultSchema
+
+    llm = FakeLLM(latency, token_rate)
+    backend = Backend("fake", llm)
+    backend.agents[NameResultSchema] = FakeAgent(llm, NameResultSchema)
+    backend.agents[NameBatchResultSchema] = FakeAgent(llm, NameBatchResultSchema)
+    agent.llm_router.backends = [backend]
+    return llm
+
+
+class SMTPSink:
+    """本地 SMTP 收信端，只记收到了多少封、发给了谁"""
+
+    def __init__(self, port: int = SMTP_PORT):
+        from aiosmtpd.controller import Controller
+
+        self.received = 0
+        self.recipients: list[str] = []
+        sink = self
+
+        class Handler:
+            async def handle_DATA(self, server, session, envelope):
+                sink.received += 1
+                sink.recipients.extend(envelope.rcpt_tos)
+                return "250 OK"
+
+        self.controller = Controller(Handler(), hostname="127.0.0.1", port=port)
+
+    def __enter__(self):
+        self.controller.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.controller.stop()
+
+
+class LoopLagMonitor:
+    """
+    每 interval 秒醒一次，实际醒来比预期晚多少就是事件循环被阻塞了多久。
+    注意：ASGITransport 不经过 socket，接口全程没有 I/O 时（比如 kv 验证码），
+    所有请求会在同一轮事件循环里跑完，这时 loop lag 接近整个场景的耗时。
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags: list[float] = []
+        self._task: asyncio.Task | None = None
+        self._last = 0.0
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._last = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(loop.time() - self._last - self.interval, 0))
+
+    def __enter__(self):
+        self.lags.clear()
+        self._last = asyncio.get_running_loop().time()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        # 最后一段没来得及醒来的也算上（请求全程不让出事件循环时只有这一段）
+        self.lags.append(max(asyncio.get_running_loop().time() - self._last - self.interval, 0))
+        self._task.cancel()
+
+    def summary(self) -> str:
+        ordered = sorted(self.lags)
+        p99 = ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)]
+        return f"loop lag p99 {p99 * 1000:6.1f}ms max {ordered[-1] * 1000:6.1f}ms"
+
+
+def load_app():
+    """导入 app，并把发信换成不登录的本地 SMTP"""
+    from main import app
+    from cores.mail_queue import mail_dispatcher
+
+    mail_dispatcher.username = None
+    mail_dispatcher.password = None
+    return app
+
+
+async def reset_db() -> None:
+    from models import Base, engine
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+@asynccontextmanager
+async def client(app):
+    """跑 lifespan（后台 worker 都会启动），用 ASGITransport 直接调用 app，不走网络"""
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as http:
+            yield http
+
+
+async def asgi_stream(app, method: str, path: str, json_body=None, headers: dict | None = None,
+                      on_chunk: Callable[[bytes], None] | None = None) -> httpx.Response:
+    """
+    直接按 ASGI 协议调用 app，每收到一段响应体就回调 on_chunk。
+    ASGITransport 会把整个响应体收完才返回，量不出流式接口的首包时间，所以流式场景用这个。
+    """
+    body = json.dumps(json_body, ensure_ascii=False).encode() if json_body is not None else b""
+    raw_headers = [(b"content-type", b"application/json")] + [
+        (key.lower().encode(), value.encode()) for key, value in (headers or {}).items()
+    ]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": raw_headers, "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    finished = asyncio.Event()
+    sent_body = False
+    status = 500
+    response_headers: list = []
+    chunks: list[bytes] = []
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # 客户端一直连着，直到响应发完
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if chunk:
+                chunks.append(chunk)
+                if on_chunk is not None:
+                    on_chunk(chunk)
+            if not message.get("more_body", False):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return httpx.Response(status, headers=response_headers, content=b"".join(chunks))
+
+
+async def run_load(
+    name: str,
+    request: Callable[[int], Awaitable],
+    total: int,
+    concurrency: int,
+) -> dict:
+    """并发执行 total 次 request(i)，打印 RPS、延迟分位数、状态码分布和事件循环延迟"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    statuses = StatusCounter()
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await request(i)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+
+    with LoopLagMonitor() as monitor:
+        start = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(total)])
+        elapsed = time.perf_counter() - start
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    print(f"{name:<12} {total / elapsed:8.1f} req/s  p50 {q[49] * 1000:7.1f}ms  p95 {q[94] * 1000:7.1f}ms  "
+          f"p99 {q[98] * 1000:7.1f}ms  {monitor.summary()}  status {dict(statuses)}")
+    return {"rps": total / elapsed, "p50": q[49], "p95": q[94], "p99": q[98], "statuses": dict(statuses)}
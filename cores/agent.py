@@ -1,17 +1,29 @@
 import asyncio
+import logging
+import time
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+from starlette.status import HTTP_502_BAD_GATEWAY, HTTP_503_SERVICE_UNAVAILABLE, HTTP_504_GATEWAY_TIMEOUT
 
-from langchain_deepseek import ChatDeepSeek
 from pydantic import SecretStr
-from langchain.agents import create_agent
-from schemas.agent import NameSchema, NameResultSchema
-from schemas.name import NameIn
 
-llm = ChatDeepSeek(
-    model="deepseek-chat",
-    api_key=SecretStr("sk-c97afbb414b44c2198a069eb3a7a26a5"),
-    temperature=1
-)
+import settings
+from cores.circuit import CircuitBreaker, CircuitOpenError, remaining, request_timeouts, set_deadline
+from cores.llm_router import Backend, LLMRouter
+from cores.metrics import registry, span
+from cores.name_parser import NameStreamParser, parse_batch_result, parse_name_result
+from cores.cache import NameCache, cache_key, kv_store, normalize_text
+from cores.singleflight import SingleFlight
+from cores.scheduler import LLMScheduler
+from cores.inventory import NameInventory, run_warmup_worker
+from cores.name_filter import CANDIDATE_COUNT, FilterStats, NameFilter, ServedNames
+from cores.tokens import fit_names, merge_usage, token_ledger, truncate_text
+from schemas.agent import NameSchema, NameResultSchema, NameBatchResultSchema
+from schemas.name import NameIn
 
+# system_prompt 是每次调用的固定前缀，服务商会缓存相同的前缀（命中部分按缓存价计费、首 token 更快），
+# 所以这里不要拼任何动态内容，用户相关的信息都放到后面的 user 消息里
 system_prompt = """
 
 你是一位精通汉语言文学、音韵学与传统文化的命名专家，
@@ -43,26 +55,426 @@ system_prompt = """
 
 """
 
-agent = create_agent(
-    model=llm,
-    system_prompt=system_prompt,
-    # 返回数据的格式
-    response_format=NameResultSchema,
+# 流式接口不走 structured output，直接让模型输出 JSON，边生成边解析
+# 拼在 system_prompt 后面，流式调用的固定前缀也是不变的
+stream_format_prompt = """
+请只输出 JSON，不要输出其他内容，格式如下：
+{"names": [{"name": "姓名", "reference": "出处", "moral": "寓意"}]}
+"""
+
+# fast 引擎的批量调用用这个格式
+batch_format_prompt = """
+请只输出 JSON，不要输出其他内容，按编号分组，格式如下：
+{"groups": [{"index": 0, "names": [{"name": "姓名", "reference": "出处", "moral": "寓意"}]}]}
+"""
+
+# fast 引擎：每种返回格式对应的格式说明和本地解析函数
+_json_formats = {
+    NameResultSchema: (stream_format_prompt, parse_name_result),
+    NameBatchResultSchema: (batch_format_prompt, parse_batch_result),
+}
+
+
+def _create_backend(config: dict) -> Backend:
+    # LangChain 导入要一两秒，放到第一次创建后端时再导入，不拖慢进程启动和测试
+    from langchain_deepseek import ChatDeepSeek
+    from langchain.agents import create_agent
+
+    options = {"api_base": config["api_base"]} if config.get("api_base") else {}
+    llm = ChatDeepSeek(
+        model=config["model"],
+        api_key=SecretStr(config["api_key"]),
+        temperature=settings.LLM_TEMPERATURE,
+        **options,
+    )
+    backend = Backend(config["name"], llm)
+    if settings.NAME_ENGINE == "fast":
+        # fast 引擎直接调用模型，不需要 agent
+        return backend
+    # 每个后端各自的 agent，按返回格式区分
+    backend.agents[NameResultSchema] = create_agent(
+        model=llm,
+        system_prompt=system_prompt,
+        # 返回数据的格式
+        response_format=NameResultSchema,
+    )
+    # 批量接口用：一次给多个人起名，按编号分组返回
+    backend.agents[NameBatchResultSchema] = create_agent(
+        model=llm,
+        system_prompt=system_prompt,
+        response_format=NameBatchResultSchema,
+    )
+    return backend
+
+
+def _create_backends() -> list[Backend]:
+    return [_create_backend(config) for config in settings.LLM_BACKENDS]
+
+
+# 后端在第一次调用（或 lifespan 里的预加载）时才创建
+llm_router = LLMRouter(
+    _create_backends,
+    timeout=settings.LLM_TIMEOUT,
+    hedge_quantile=settings.LLM_HEDGE_QUANTILE,
+    hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+    hedge_default_delay=settings.LLM_HEDGE_DEFAULT_DELAY,
+    max_hedge_ratio=settings.LLM_MAX_HEDGE_RATIO,
+)
+
+# 所有后端都出错（或超时）的比例太高时熔断，/name 直接返回缓存结果或 503，不再排队等模型
+name_breaker = CircuitBreaker(
+    "llm",
+    failure_rate=settings.LLM_CIRCUIT_FAILURE_RATE,
+    min_calls=settings.LLM_CIRCUIT_MIN_CALLS,
+    window=settings.LLM_CIRCUIT_WINDOW,
+    open_seconds=settings.LLM_CIRCUIT_OPEN_SECONDS,
+)
+logger = logging.getLogger(__name__)
+
+
+class IncompleteResultError(Exception):
+    """校验和补充生成之后一个合格的名字都没有"""
+
+
+name_degraded = registry.counter(
+    "name_degraded_total", "熔断或超时时返回了缓存结果的请求", ("reason",),
+)
+
+# 相同（规范化后）的起名请求直接走缓存，不再重复调用大模型
+name_cache = NameCache(
+    maxsize=settings.NAME_CACHE_MAXSIZE,
+    ttl=settings.NAME_CACHE_TTL,
+    shared=kv_store,
+    pool_size=settings.NAME_CACHE_POOL_SIZE,
+)
+
+# 并发的相同请求只调用一次大模型，其余请求等待同一个结果
+name_flight = SingleFlight()
 
+# 所有大模型调用都要经过调度器排队
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    rate=settings.LLM_RATE_PER_SECOND,
+    burst=settings.LLM_BURST,
+    max_queue=settings.LLM_MAX_QUEUE,
+    max_queue_per_user=settings.LLM_MAX_QUEUE_PER_USER,
 )
 
-async def generate_name(name_info: NameIn) -> NameResultSchema:
+# 热门组合的预生成库存，没有自定义要求的请求直接从这里取
+name_inventory = NameInventory(
+    top_k=settings.INVENTORY_TOP_K,
+    names_per_key=settings.INVENTORY_NAMES_PER_KEY,
+    ttl=settings.INVENTORY_TTL,
+)
+
+# 每个用户最近推荐过的名字，以及名字校验的统计
+served_names = ServedNames(
+    max_users=settings.SERVED_NAMES_MAX_USERS,
+    per_user=settings.SERVED_NAMES_PER_USER,
+    ttl=settings.SERVED_NAMES_TTL,
+)
+filter_stats = FilterStats()
+
+
+def build_prompt(name_info: NameIn) -> str:
     # 上面的prompt是系统提示词，这个不是
-    prompt = (f"用户的姓是：{name_info.surname}，用户的性别是：{name_info.gender}，字数限制是：{name_info.length}，"
-              f"其他要求是：{name_info.other}，这些名字不要：{'、'.join(name_info.exclude)}")
-    result = await agent.ainvoke({
+    # other / exclude 是用户随便填的，按 token 预算截断，防止 prompt 无限变长
+    other = truncate_text(name_info.other, settings.NAME_OTHER_MAX_TOKENS)
+    exclude = fit_names(name_info.exclude, settings.NAME_EXCLUDE_MAX_TOKENS)
+    return (f"用户的姓是：{name_info.surname}，用户的性别是：{name_info.gender}，字数限制是：{name_info.length}，"
+            f"其他要求是：{other}，这些名字不要：{exclude}")
+
+
+def build_topup_prompt(name_info: NameIn, count: int, blocked: list[str]) -> str:
+    # 补充生成只要缺的数量，prompt 也更短
+    other = truncate_text(name_info.other, settings.NAME_OTHER_MAX_TOKENS)
+    blocked = fit_names(blocked, settings.NAME_EXCLUDE_MAX_TOKENS)
+    return (f"姓：{name_info.surname}，性别：{name_info.gender}，字数：{name_info.length}，"
+            f"其他要求：{other}。只需要再给 {count} 个，不要：{blocked}")
+
+
+def build_batch_prompt(name_infos: list[NameIn]) -> str:
+    lines = ["请分别为下面几位用户起名，每一位都提供 5 个候选，并按编号分组返回："]
+    for index, name_info in enumerate(name_infos):
+        lines.append(f"{index}. {build_prompt(name_info)}")
+    return "\n".join(lines)
+
+
+async def _call_agent(backend: Backend, response_format: type, prompt: str) -> dict:
+    start = time.perf_counter()
+    result = await backend.agents[response_format].ainvoke({
         "messages":[
             {"role":"user", "content":prompt}
         ],
     })
     # print(result)
+    token_ledger.record(merge_usage(result["messages"]), time.perf_counter() - start)
+    return result
+
+
+async def _call_fast(backend: Backend, response_format: type, prompt: str) -> dict:
+    """
+    fast 引擎：一次 JSON 模式的对话调用，本地解析校验，不经过 agent 图，也没有结构化输出的工具调用。
+    system 消息和流式接口一样是固定前缀，能共用服务商的前缀缓存。
+    JSON 有小问题时本地修补；实在解析不了算这个后端出错，由路由回退到下一个后端。
+    """
+    format_prompt, parse = _json_formats[response_format]
+    start = time.perf_counter()
+    message = await backend.llm.ainvoke(
+        [
+            {"role": "system", "content": system_prompt + format_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        response_format={"type": "json_object"},
+    )
+    token_ledger.record(message.usage_metadata, time.perf_counter() - start)
+    structured = parse(message.text)
+    if structured is None:
+        raise ValueError(f"模型返回的内容无法解析成 {response_format.__name__}")
+    return {"messages": [message], "structured_response": structured}
+
+
+# 返回值都是 {"messages": [...], "structured_response": ...}，上层不用关心用的哪个引擎
+_call_model = _call_fast if settings.NAME_ENGINE == "fast" else _call_agent
+
+
+async def _guarded(response_format: type, prompt: str) -> dict:
+    """经过熔断器调用模型：路由选后端，慢了对冲、出错回退，最终结果记到熔断器里"""
+    name_breaker.check()
+    try:
+        result = await llm_router.invoke(lambda backend: _call_model(backend, response_format, prompt))
+    except asyncio.CancelledError:
+        name_breaker.record_cancelled()
+        raise
+    except Exception:
+        name_breaker.record_failure()
+        raise
+    name_breaker.record_success()
+    return result
+
+
+async def _invoke_agent(prompt: str) -> NameResultSchema:
+    with span("name.llm"):
+        result = await _guarded(NameResultSchema, prompt)
     return result["structured_response"]
 
+
+async def _validate(
+    name_info: NameIn,
+    result: NameResultSchema,
+    user_id: int | None,
+    avoid: list[str] = (),
+) -> NameResultSchema:
+    """
+    去掉被排除的、不带姓的、重复的、推荐过的名字；不够 5 个时只让模型补缺的数量，
+    不用整个重新生成。补充生成（包括排队）不超过请求的截止时间，到点了就返回已有的
+    """
+    name_filter = NameFilter(name_info, avoid)
+    names = name_filter.apply(result.names)
+    for _ in range(settings.NAME_TOPUP_ROUNDS):
+        missing = CANDIDATE_COUNT - len(names)
+        left = remaining()
+        if missing <= 0 or (left is not None and left <= 0):
+            break
+        prompt = build_topup_prompt(name_info, missing, name_filter.blocked())
+        try:
+            extra = await asyncio.wait_for(llm_scheduler.run(user_id, lambda: _invoke_agent(prompt)), left)
+        except Exception as e:
+            # 补充生成失败（熔断、超时、排队满的 429/503、模型出错）就返回已有的，由调用方决定够不够用
+            logger.warning("补充生成失败: %r", e)
+            break
+        filter_stats.topup_calls += 1
+        names += name_filter.apply(extra.names)[:missing]
+    filter_stats.checked += len(name_filter.seen) + name_filter.rejected
+    filter_stats.rejected += name_filter.rejected
+    return NameResultSchema(names=names[:CANDIDATE_COUNT])
+
+
+async def _generate_and_cache(key: str, name_info: NameIn, user_id: int | None) -> NameResultSchema:
+    # 写缓存也放在合并后的调用里，由还在等的请求方共享；所有请求方都断开时 SingleFlight 会取消这次调用
+    prompt = build_prompt(name_info)
+    result = await llm_scheduler.run(user_id, lambda: _invoke_agent(prompt))
+    # 缓存里存的是和用户无关的校验结果（只按 exclude 和姓氏过滤）
+    result = await _validate(name_info, result, user_id)
+    if not result.names:
+        raise IncompleteResultError("没有合格的名字")
+    # 凑不够的结果照样返回（模型已经调用过了），但不缓存，否则所有人都会拿到这个残缺的结果直到过期
+    if len(result.names) >= CANDIDATE_COUNT:
+        await name_cache.add(key, result)
+    return result
+
+
+async def lookup_name(name_info: NameIn, avoid: list[str] = ()) -> NameResultSchema | None:
+    """只查库存和缓存，不调用模型"""
+    name_inventory.record(name_info)
+    stocked = name_inventory.lookup(name_info, avoid)
+    if stocked is not None:
+        return stocked
+    return await name_cache.get(cache_key(name_info))
+
+
+async def _degraded(key: str, error: Exception) -> NameResultSchema:
+    """熔断、超时或模型出错：有缓存（哪怕池没装满）就返回缓存，没有就 503 / 504 / 502"""
+    if isinstance(error, CircuitOpenError):
+        reason = "circuit_open"
+    elif isinstance(error, asyncio.TimeoutError):
+        reason = "timeout"
+        request_timeouts.inc(1, "name")
+    else:
+        reason = "error"
+        logger.warning("起名失败: %r", error)
+    cached = await name_cache.peek(key)
+    if cached is not None:
+        name_degraded.inc(1, reason)
+        return cached
+    if reason == "circuit_open":
+        raise HTTPException(
+            status_code=HTTP_503_SERVICE_UNAVAILABLE,
+            detail="起名服务暂时不可用，请稍后再试",
+            headers={"Retry-After": str(max(round(error.retry_after), 1))},
+        )
+    if reason == "timeout":
+        raise HTTPException(status_code=HTTP_504_GATEWAY_TIMEOUT, detail="起名超时，请稍后再试")
+    raise HTTPException(status_code=HTTP_502_BAD_GATEWAY, detail="起名服务出错，请稍后再试")
+
+
+async def generate_name(
+    name_info: NameIn,
+    user_id: int | None = None,
+    track_served: bool = True,
+) -> NameResultSchema:
+    """
+    track_served=True 时不会给同一个用户推荐重复的名字（批量接口里关掉）
+    整个请求有 NAME_REQUEST_TIMEOUT 的截止时间，排队、模型调用和补充生成都在这个时间内
+    """
+    set_deadline(settings.NAME_REQUEST_TIMEOUT)
+    avoid = served_names.get(user_id) if track_served else []
+    with span("name.lookup"):
+        result = await lookup_name(name_info, avoid)
+    if result is None:
+        key = cache_key(name_info)
+        try:
+            if name_breaker.is_open():
+                raise CircuitOpenError(name_breaker.retry_after())
+            # 包含排队、模型调用和校验补充，和 name.llm / llm.queue 对比就知道时间花在哪
+            with span("name.generate"):
+                result = await asyncio.wait_for(
+                    name_flight.do(key, lambda: _generate_and_cache(key, name_info, user_id)),
+                    remaining(),
+                )
+        except HTTPException:
+            # 调度器排队满了的 429/503，原样返回
+            raise
+        except Exception as e:
+            result = await _degraded(key, e)
+    if avoid:
+        with span("name.validate"):
+            personal = await _validate(name_info, result, user_id, avoid)
+        if len(personal.names) < CANDIDATE_COUNT:
+            # 去掉推荐过的名字后补不够：用原结果里推荐过的名字补齐，重复推荐总比返回残缺结果好
+            base_filter = NameFilter(name_info, [normalize_text(item.name) for item in personal.names])
+            personal.names += base_filter.apply(result.names)[:CANDIDATE_COUNT - len(personal.names)]
+        result = personal
+    filter_stats.responses += 1
+    if track_served:
+        served_names.add(user_id, result.names)
+    return result
+
+
+async def generate_names_packed(name_infos: list[NameIn], user_id: int | None = None) -> list[NameResultSchema | None]:
+    """
+    把几个请求合成一个 prompt 调用一次模型；模型漏掉的编号返回 None，由调用方单独补
+    """
+    prompt = build_batch_prompt(name_infos)
+
+    async def invoke():
+        with span("name.llm_batch"):
+            return await _guarded(NameBatchResultSchema, prompt)
+
+    result = await llm_scheduler.run(user_id, invoke)
+    groups = {group.index: group for group in result["structured_response"].groups}
+    results = []
+    for index, name_info in enumerate(name_infos):
+        group = groups.get(index)
+        # 和单独调用一样校验，凑不够的交给调用方单独再调一次
+        names = [] if group is None else NameFilter(name_info).apply(group.names)
+        if len(names) < CANDIDATE_COUNT:
+            results.append(None)
+            continue
+        names = NameResultSchema(names=names[:CANDIDATE_COUNT])
+        await name_cache.add(cache_key(name_info), names)
+        results.append(names)
+    return results
+
+
+async def _generate_for_inventory(name_info: NameIn) -> NameResultSchema:
+    # 预热任务当作一个单独的"用户"参与调度，不会挤占真实用户的请求
+    prompt = build_prompt(name_info)
+    return await llm_scheduler.run("inventory", lambda: _invoke_agent(prompt))
+
+
+async def run_inventory_worker() -> None:
+    await run_warmup_worker(
+        name_inventory,
+        _generate_for_inventory,
+        interval=settings.INVENTORY_REFRESH_INTERVAL,
+        batch=settings.INVENTORY_BATCH,
+        off_peak_hours=settings.INVENTORY_OFF_PEAK_HOURS,
+    )
+
+
+async def stream_names(name_info: NameIn, user_id: int | None = None) -> AsyncIterator[NameSchema]:
+    """
+    流式生成：模型每输出完一个完整的候选，就立刻 yield 出去
+    """
+    avoid = served_names.get(user_id)
+    # user_filter 还要过滤推荐过的名字；写缓存只用和用户无关的 base_filter
+    user_filter = NameFilter(name_info, avoid)
+    base_filter = NameFilter(name_info)
+    key = cache_key(name_info)
+    cached = await lookup_name(name_info, avoid)
+    if cached is not None:
+        # 只记下真正发出去的：被过滤掉的、或者客户端中途断开没收到的都不算推荐过
+        for item in user_filter.apply(cached.names):
+            yield item
+            served_names.add(user_id, [item])
+        return
+
+    parser = NameStreamParser()
+    names: list[NameSchema] = []
+    messages = [
+        {"role": "system", "content": system_prompt + stream_format_prompt},
+        {"role": "user", "content": build_prompt(name_info)},
+    ]
+    usage = None
+    name_breaker.check()
+    # 流式输出已经发给用户的部分没法对冲或重来，直接用当前最快的后端
+    llm = llm_router.fastest().llm
+    async with llm_scheduler.slot(user_id):
+        start = time.perf_counter()
+        try:
+            # stream_usage：最后一个 chunk 带上 token 用量
+            async for chunk in llm.astream(messages, stream_usage=True):
+                usage = chunk.usage_metadata or usage
+                for item in parser.feed(chunk.text):
+                    if base_filter.accept(item):
+                        names.append(item)
+                    if user_filter.accept(item):
+                        served_names.add(user_id, [item])
+                        yield item
+        except Exception:
+            name_breaker.record_failure()
+            raise
+        except BaseException:
+            # 客户端断开：生成器被关闭或 task 被取消
+            name_breaker.record_cancelled()
+            raise
+        name_breaker.record_success()
+        token_ledger.record(usage, time.perf_counter() - start)
+    # 完整生成完、而且凑够了数量才写缓存，中途断开的不算
+    if len(names) >= CANDIDATE_COUNT:
+        await name_cache.add(key, NameResultSchema(names=names))
+
 # async def main():
 #     name_info = NameIn(
 #         surname="张",
@@ -1,16 +1,24 @@
 # core/auth.py
+import hashlib
+import logging
+import time
+
 import jwt
 from datetime import datetime
 from enum import Enum
 from threading import Lock
 
 import settings
+from cores.cache import LRUCache
+from cores.metrics import span
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from starlette.status import HTTP_401_UNAUTHORIZED, HTTP_403_FORBIDDEN
 
 # 依赖：pip install pyjwt==2.10.1
 
+logger = logging.getLogger(__name__)
+
 
 class SingletonMeta(type):
     """Thread-safe Singleton MetaClass."""
@@ -18,6 +26,10 @@ class SingletonMeta(type):
     _lock: Lock = Lock()
 
     def __call__(cls, *args, **kwargs):
+        # 已经创建过就直接返回，不用每次都抢锁（双重检查）
+        instance = cls._instances.get(cls)
+        if instance is not None:
+            return instance
         with cls._lock:
             if cls not in cls._instances:
                 instance = super().__call__(*args, **kwargs)
@@ -43,6 +55,23 @@ class AuthHandler(metaclass=SingletonMeta):
 
     def __init__(self):
         self.secret = settings.JWT_SECRET_KEY
+        # 密钥轮换：kid -> secret，新 token 用 JWT_ACTIVE_KID 签名，旧 kid 留着校验未过期的 token
+        self.secrets = settings.JWT_SECRET_KEYS
+        self.active_kid = settings.JWT_ACTIVE_KID
+        # 已经校验过的 access token：sha256(token) -> (user_id, kid)，到 exp 自动过期
+        self._token_cache = LRUCache(maxsize=settings.JWT_CACHE_SIZE)
+        # auth_wrapper 是同步依赖，在线程池里跑，LRUCache 本身不是线程安全的
+        self._token_cache_lock = Lock()
+
+    def _secret_for(self, token: str) -> tuple[str, str | None]:
+        """按 token 头里的 kid 找密钥；没有 kid 的老 token 用 JWT_SECRET_KEY"""
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid is None:
+            return self.secret, None
+        secret = self.secrets.get(kid)
+        if secret is None:
+            raise jwt.InvalidTokenError(f"未知的 kid: {kid}")
+        return secret, kid
 
     def _encode_token(self, user_id: int, token_type: TokenTypeEnum) -> str:
         """
@@ -63,7 +92,12 @@ class AuthHandler(metaclass=SingletonMeta):
 
         payload["exp"] = int(exp.timestamp())
 
-        return jwt.encode(payload, self.secret, algorithm="HS256")
+        return jwt.encode(
+            payload,
+            self.secrets[self.active_kid],
+            algorithm="HS256",
+            headers={"kid": self.active_kid},
+        )
 
     def encode_login_token(self, user_id: int) -> dict:
         """登录时返回 access_token + refresh_token"""
@@ -83,9 +117,23 @@ class AuthHandler(metaclass=SingletonMeta):
         """
         ACCESS TOKEN: 不可用（过期，或有问题），都用 403
         返回 user_id
+
+        校验通过的 token 会缓存到它过期为止，之后同一个 token 只查一次字典
         """
+        with span("auth.decode_access_token"):
+            return self._decode_access_token(token)
+
+    def _decode_access_token(self, token: str) -> int:
+        cache_key = hashlib.sha256(token.encode()).digest()
+        with self._token_cache_lock:
+            cached = self._token_cache.get(cache_key)
+        # kid 被移出配置后，用它签的 token 立即失效
+        if cached is not None and (cached[1] is None or cached[1] in self.secrets):
+            return cached[0]
+
         try:
-            payload = jwt.decode(token, self.secret, algorithms=["HS256"])
+            secret, kid = self._secret_for(token)
+            payload = jwt.decode(token, secret, algorithms=["HS256"])
 
             # ✅ sub 是 string，所以对比也用 string
             if payload.get("sub") != str(int(TokenTypeEnum.ACCESS_TOKEN.value)):
@@ -101,7 +149,12 @@ class AuthHandler(metaclass=SingletonMeta):
                     detail="Token缺少iss字段！",
                 )
 
-            return int(iss)
+            user_id = int(iss)
+            ttl = payload["exp"] - time.time()
+            if ttl > 0:
+                with self._token_cache_lock:
+                    self._token_cache.set(cache_key, (user_id, kid), ttl=ttl)
+            return user_id
 
         except jwt.ExpiredSignatureError:
             raise HTTPException(
@@ -109,10 +162,8 @@ class AuthHandler(metaclass=SingletonMeta):
                 detail="Access Token已过期",
             )
         except jwt.InvalidTokenError as e:
-            # 开发期排查用：看清楚到底是啥原因（签名不匹配/格式不对等）
-            # 生产环境建议去掉 print，改为日志
-            print("JWT InvalidTokenError:", repr(e))
-            print("Using secret:", self.secret)
+            # 排查用：记下具体原因（签名不匹配/格式不对等），不要把密钥打进日志
+            logger.info("JWT InvalidTokenError: %r", e)
             raise HTTPException(
                 status_code=HTTP_403_FORBIDDEN,
                 detail=f"Access Token不可用: {e}",
@@ -124,7 +175,8 @@ class AuthHandler(metaclass=SingletonMeta):
         返回 user_id
         """
         try:
-            payload = jwt.decode(token, self.secret, algorithms=["HS256"])
+            secret, _ = self._secret_for(token)
+            payload = jwt.decode(token, secret, algorithms=["HS256"])
 
             if payload.get("sub") != str(int(TokenTypeEnum.REFRESH_TOKEN.value)):
                 raise HTTPException(
@@ -0,0 +1,174 @@
+# core/batch.py
+import asyncio
+import json
+import time
+import uuid
+
+from fastapi import HTTPException
+
+import settings
+from cores.agent import generate_name, generate_names_packed, lookup_name
+from cores.cache import LRUCache, cache_key, kv_store, normalize_text
+from cores.history import history_writer
+from schemas.agent import NameResultSchema
+from schemas.name import NameIn, NameBatchItemOut, NameBatchOut
+
+
+class BatchJob:
+    def __init__(self, user_id: int, total: int):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.total = total
+        self.finished = 0
+        self.items: list[NameBatchItemOut | None] = [None] * total
+        self.saved_at = 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.finished == self.total
+
+    def to_out(self) -> NameBatchOut:
+        return NameBatchOut(
+            job_id=self.id,
+            status="done" if self.done else "running",
+            total=self.total,
+            finished=self.finished,
+            items=[item for item in self.items if item is not None],
+        )
+
+
+# 任务结果在内存里保留一段时间，供 GET /name/batch/{id} 轮询
+batch_jobs = LRUCache(maxsize=settings.NAME_BATCH_MAX_JOBS, ttl=settings.NAME_BATCH_JOB_TTL)
+# 配了共享的 KV（Redis）时，进度也写一份到 kv_store，多 worker 时轮询落到别的 worker 上也查得到
+_shared_jobs = not settings.KV_URL.startswith("memory://")
+# 多 worker 又没有共享 KV 时，别的 worker 查不到任务，只能同步执行、直接返回结果
+_async_allowed = _shared_jobs or settings.WEB_CONCURRENCY == 1
+# 持有后台任务的引用，防止被垃圾回收
+_background: set[asyncio.Task] = set()
+
+
+def _job_key(job_id: str) -> str:
+    return f"batch:{job_id}"
+
+
+async def _save(job: BatchJob, force: bool = False) -> None:
+    """把进度写到共享 KV；进行中的最多每 NAME_BATCH_SAVE_INTERVAL 秒写一次，不然大批次要写上千次"""
+    if not _shared_jobs:
+        return
+    now = time.monotonic()
+    if not force and now - job.saved_at < settings.NAME_BATCH_SAVE_INTERVAL:
+        return
+    job.saved_at = now
+    data = {"user_id": job.user_id, "job": job.to_out().model_dump(mode="json")}
+    await kv_store.set(_job_key(job.id), json.dumps(data, ensure_ascii=False), ex=settings.NAME_BATCH_JOB_TTL)
+
+
+async def run_batch(job: BatchJob, items: list[NameIn]) -> None:
+    """
+    1. 相同的请求去重，只算一次
+    2. 库存/缓存里有的直接返回
+    3. 要求简单的请求几个一组合成一次调用，其余的单独调用，整体并发受限
+    """
+    positions: dict[str, list[int]] = {}
+    unique: dict[str, NameIn] = {}
+    for index, item in enumerate(items):
+        key = cache_key(item)
+        positions.setdefault(key, []).append(index)
+        unique.setdefault(key, item)
+
+    def finish(key: str, result: NameResultSchema | None = None, error: str | None = None):
+        for index in positions[key]:
+            job.items[index] = NameBatchItemOut(
+                index=index,
+                names=None if result is None else result.names,
+                error=error,
+            )
+            job.finished += 1
+            if result is not None:
+                history_writer.record(job.user_id, items[index], result.names)
+
+    pending = []
+    for key, item in unique.items():
+        cached = await lookup_name(item)
+        if cached is not None:
+            finish(key, cached)
+        else:
+            pending.append(key)
+    await _save(job)
+
+    semaphore = asyncio.Semaphore(settings.NAME_BATCH_CONCURRENCY)
+
+    async def run_single(key: str):
+        async with semaphore:
+            try:
+                finish(key, await generate_name(unique[key], job.user_id, track_served=False))
+            except HTTPException as e:
+                finish(key, error=str(e.detail))
+            except Exception as e:
+                finish(key, error=str(e))
+        await _save(job)
+
+    async def run_pack(keys: list[str]):
+        async with semaphore:
+            try:
+                results = await generate_names_packed([unique[key] for key in keys], job.user_id)
+            except Exception:
+                results = [None] * len(keys)
+        # 合并调用没拿到结果的，单独再调一次
+        retry = []
+        for key, result in zip(keys, results):
+            if result is None:
+                retry.append(key)
+            else:
+                finish(key, result)
+        await _save(job)
+        await asyncio.gather(*[run_single(key) for key in retry])
+
+    packable = [
+        key for key in pending
+        if len(normalize_text(unique[key].other)) <= settings.NAME_BATCH_PACK_OTHER_MAX
+    ]
+    singles = [key for key in pending if key not in packable]
+    size = settings.NAME_BATCH_PACK_SIZE
+    packs = [packable[i:i + size] for i in range(0, len(packable), size)]
+    # 只剩一个的组没必要合并
+    if packs and len(packs[-1]) == 1:
+        singles += packs.pop()
+
+    try:
+        await asyncio.gather(
+            *[run_pack(keys) for keys in packs],
+            *[run_single(key) for key in singles],
+        )
+    finally:
+        await _save(job, force=True)
+
+
+async def submit_batch(items: list[NameIn], user_id: int, async_mode: bool) -> BatchJob:
+    job = BatchJob(user_id, len(items))
+    batch_jobs.set(job.id, job)
+    if _async_allowed and (async_mode or len(items) > settings.NAME_BATCH_SYNC_MAX):
+        await _save(job, force=True)
+        task = asyncio.create_task(run_batch(job, items))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+    else:
+        await run_batch(job, items)
+    return job
+
+
+async def get_batch(job_id: str, user_id: int) -> NameBatchOut | None:
+    # 本 worker 创建的任务直接看内存里最新的进度，否则去共享 KV 里找
+    job: BatchJob | None = batch_jobs.get(job_id)
+    if job is not None:
+        # 只能查自己的任务
+        return job.to_out() if job.user_id == user_id else None
+    if not _shared_jobs:
+        return None
+    raw = await kv_store.get(_job_key(job_id))
+    if raw is None:
+        return None
+    data = json.loads(raw)
+    if data["user_id"] != user_id:
+        return None
+    return NameBatchOut.model_validate(data["job"])
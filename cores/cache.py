@@ -0,0 +1,271 @@
+# core/cache.py
+import json
+import logging
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Protocol
+
+import settings
+from schemas.agent import NameResultSchema, NameSchema
+from schemas.name import NameIn
+
+logger = logging.getLogger(__name__)
+
+# 可选依赖：共享缓存层使用 Redis 时需要 pip install redis
+
+
+class LRUCache:
+    """
+    进程内 LRU 缓存，带 TTL 和容量上限（非线程安全，给单个事件循环用）
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Any, tuple[float | None, Any]] = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expire_at, value = item
+        if expire_at is not None and expire_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expire_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expire_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class KVStore(Protocol):
+    """共享缓存层的最小接口，和 redis.asyncio.Redis 的同名方法兼容"""
+
+    async def get(self, key: str) -> str | bytes | None: ...
+
+    async def set(self, key: str, value: str, ex: int | None = None) -> Any: ...
+
+    async def delete(self, key: str) -> Any: ...
+
+    async def incr(self, key: str) -> int: ...
+
+    async def expire(self, key: str, seconds: int) -> Any: ...
+
+
+class MemoryKVStore:
+    """
+    Redis 的本地替身：只实现用得到的几个命令，过期时间由存储自己负责
+    """
+
+    def __init__(self):
+        self._data: dict[str, tuple[float | None, str]] = {}
+
+    def _alive(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expire_at, value = item
+        if expire_at is not None and expire_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    async def get(self, key: str) -> str | None:
+        item = self._alive(key)
+        return None if item is None else item[1]
+
+    async def set(self, key: str, value: str, ex: int | None = None) -> bool:
+        expire_at = time.monotonic() + ex if ex else None
+        self._data[key] = (expire_at, value)
+        return True
+
+    async def delete(self, key: str) -> int:
+        return 1 if self._data.pop(key, None) is not None else 0
+
+    async def incr(self, key: str) -> int:
+        # 和 Redis 一样：key 不存在时从 0 开始，保留原来的过期时间
+        item = self._alive(key)
+        expire_at, value = item if item is not None else (None, "0")
+        value = str(int(value) + 1)
+        self._data[key] = (expire_at, value)
+        return int(value)
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        item = self._alive(key)
+        if item is None:
+            return False
+        self._data[key] = (time.monotonic() + seconds, item[1])
+        return True
+
+
+def create_kv_store(url: str) -> KVStore:
+    """
+    memory:// 使用进程内替身；redis:// 或 rediss:// 使用真正的 Redis
+    """
+    if url.startswith(("redis://", "rediss://")):
+        from redis.asyncio import Redis
+
+        return Redis.from_url(url, decode_responses=True)
+    return MemoryKVStore()
+
+
+def normalize_text(text: str | None) -> str:
+    # 全角/半角统一、去掉多余空白和结尾的标点
+    text = unicodedata.normalize("NFKC", text or "")
+    text = " ".join(text.split())
+    return text.rstrip("。.!！~～ ")
+
+
+def cache_key(name_info: NameIn) -> str:
+    """
+    把 NameIn 规范化成缓存 key：other 去空白/统一全半角，exclude 去重排序
+    """
+    exclude = sorted({normalize_text(name) for name in name_info.exclude} - {""})
+    payload = [
+        normalize_text(name_info.surname),
+        name_info.gender,
+        name_info.length,
+        normalize_text(name_info.other),
+        exclude,
+    ]
+    return "name:" + json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+class _Pool:
+    """同一个 key 下缓存的多份结果，以及轮换出名字的游标"""
+
+    __slots__ = ("variants", "cursor")
+
+    def __init__(self, variants: list[NameResultSchema]):
+        self.variants = variants
+        self.cursor = 0
+
+
+class NameCache:
+    """
+    起名结果的两级缓存：进程内 LRU + 可插拔的共享层（Redis 或本地替身）
+
+    pool_size > 1 时开启池模式：每个 key 最多保存 pool_size 份结果，
+    池没装满之前按未命中处理（继续调用大模型补充），装满之后
+    每次从所有候选名字里轮换取出 serve_size 个，重复请求也能看到不同的名字。
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: int,
+        shared: KVStore | None = None,
+        pool_size: int = 1,
+        serve_size: int = 5,
+    ):
+        self.local = LRUCache(maxsize, ttl)
+        self.shared = shared
+        self.ttl = ttl
+        self.pool_size = max(pool_size, 1)
+        self.serve_size = serve_size
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    async def _load(self, key: str) -> _Pool | None:
+        pool = self.local.get(key)
+        if pool is not None:
+            return pool
+        if self.shared is None:
+            return None
+        try:
+            raw = await self.shared.get(key)
+        except Exception as e:
+            logger.warning("共享缓存读取失败: %r", e)
+            return None
+        if raw is None:
+            return None
+        variants = [NameResultSchema.model_validate(item) for item in json.loads(raw)]
+        pool = _Pool(variants)
+        self.local.set(key, pool)
+        return pool
+
+    def _serve(self, pool: _Pool) -> NameResultSchema:
+        if self.pool_size == 1:
+            return pool.variants[-1]
+        names: list[NameSchema] = []
+        seen = set()
+        for variant in pool.variants:
+            for item in variant.names:
+                if item.name not in seen:
+                    seen.add(item.name)
+                    names.append(item)
+        if not names:
+            return NameResultSchema(names=[])
+        count = min(self.serve_size, len(names))
+        start = pool.cursor % len(names)
+        pool.cursor = start + count
+        return NameResultSchema(names=[names[(start + i) % len(names)] for i in range(count)])
+
+    async def get(self, key: str) -> NameResultSchema | None:
+        in_local = key in self.local
+        pool = await self._load(key)
+        if pool is None or len(pool.variants) < self.pool_size:
+            self.misses += 1
+            return None
+        if in_local:
+            self.local_hits += 1
+        else:
+            self.shared_hits += 1
+        return self._serve(pool)
+
+    async def peek(self, key: str) -> NameResultSchema | None:
+        """降级用：池没装满也返回已有的结果，不计入命中率"""
+        pool = await self._load(key)
+        if pool is None or not pool.variants:
+            return None
+        return self._serve(pool)
+
+    async def add(self, key: str, result: NameResultSchema) -> None:
+        pool = await self._load(key) or _Pool([])
+        pool.variants.append(result)
+        del pool.variants[:-self.pool_size]
+        self.local.set(key, pool)
+        if self.shared is None:
+            return
+        raw = json.dumps(
+            [variant.model_dump() for variant in pool.variants],
+            ensure_ascii=False,
+        )
+        try:
+            await self.shared.set(key, raw, ex=self.ttl)
+        except Exception as e:
+            logger.warning("共享缓存写入失败: %r", e)
+
+    def stats(self) -> dict:
+        hits = self.local_hits + self.shared_hits
+        total = hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "local_size": len(self.local),
+        }
+
+
+kv_store = create_kv_store(settings.KV_URL)
@@ -0,0 +1,169 @@
+# core/circuit.py
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from cores.metrics import registry
+
+circuit_trips = registry.counter(
+    "circuit_trips_total", "熔断器打开的次数", ("circuit",),
+)
+circuit_rejected = registry.counter(
+    "circuit_rejected_total", "熔断期间被直接拒绝的调用", ("circuit",),
+)
+request_timeouts = registry.counter(
+    "request_timeouts_total", "超过请求截止时间的调用", ("stage",),
+)
+
+# 当前请求的截止时间（loop.time()），在新建的 task 里也能拿到
+_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+def set_deadline(timeout: float) -> None:
+    """给当前请求设置截止时间；已经有更早的截止时间时保留更早的"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    current = _deadline.get()
+    if current is None or deadline < current:
+        _deadline.set(deadline)
+
+
+def remaining(default: float | None = None) -> float | None:
+    """距离截止时间还有多少秒；没有设置截止时间时返回 default"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    left = deadline - asyncio.get_running_loop().time()
+    return left if default is None else min(left, default)
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开中，调用被直接拒绝"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"服务暂时不可用，{retry_after:.0f} 秒后重试")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    按错误率熔断：
+    - closed：正常放行，统计最近 window 秒内的成功/失败
+    - 调用数不少于 min_calls 且错误率达到 failure_rate 时打开（open），open_seconds 内直接拒绝
+    - 之后进入 half_open，只放 half_open_calls 个试探调用：全部成功就关闭，有失败就重新打开
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 10,
+        window: float = 60,
+        open_seconds: float = 30,
+        half_open_calls: int = 2,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._failures = 0
+        self._probes = 0
+        self._probe_successes = 0
+        # 指标
+        self.trips = 0
+        self.rejected = 0
+
+    def retry_after(self) -> float:
+        return max(self._opened_at + self.open_seconds - time.monotonic(), 0)
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if self.retry_after() > 0:
+                self.rejected += 1
+                circuit_rejected.inc(1, self.name)
+                return False
+            self.state = self.HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+        if self.state == self.HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                self.rejected += 1
+                circuit_rejected.inc(1, self.name)
+                return False
+            self._probes += 1
+        return True
+
+    def is_open(self) -> bool:
+        """只看状态不占试探名额，排队之前快速失败用（返回 True 时计入拒绝次数）"""
+        if self.state == self.OPEN and self.retry_after() > 0:
+            self.rejected += 1
+            circuit_rejected.inc(1, self.name)
+            return True
+        return False
+
+    def check(self) -> None:
+        """不允许调用时抛出 CircuitOpenError"""
+        if not self.allow():
+            raise CircuitOpenError(self.retry_after() or self.open_seconds)
+
+    def _prune(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            _, ok = self._outcomes.popleft()
+            if not ok:
+                self._failures -= 1
+
+    def _trip(self) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._failures = 0
+        self.trips += 1
+        circuit_trips.inc(1, self.name)
+
+    def record_success(self) -> None:
+        if self.state == self.OPEN:
+            return
+        if self.state == self.HALF_OPEN:
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_calls:
+                self.state = self.CLOSED
+            return
+        now = time.monotonic()
+        self._prune(now)
+        self._outcomes.append((now, True))
+
+    def record_cancelled(self) -> None:
+        """调用被取消（客户端断开），不算成功也不算失败，把试探名额还回去"""
+        if self.state == self.HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record_failure(self) -> None:
+        if self.state == self.HALF_OPEN:
+            self._trip()
+            return
+        if self.state == self.OPEN:
+            return
+        now = time.monotonic()
+        self._prune(now)
+        self._outcomes.append((now, False))
+        self._failures += 1
+        total = len(self._outcomes)
+        if total >= self.min_calls and self._failures / total >= self.failure_rate:
+            self._trip()
+
+    def stats(self) -> dict:
+        total = len(self._outcomes)
+        return {
+            "state": self.state,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "window_calls": total,
+            "window_error_rate": self._failures / total if total else 0.0,
+        }
@@ -0,0 +1,170 @@
+# core/history.py
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from models import AsyncSessionFactory
+from models.name import NameCandidate, NameRequest
+from repository.name_repo import NameRepository
+from schemas.agent import NameSchema
+from schemas.name import NameIn
+
+import settings
+from cores.metrics import stage_latency
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryWriter:
+    """
+    起名记录异步落库（write-behind）：接口里只把结果放进队列就返回，后台 worker 攒一批写一次。
+    - 第一条记录到了之后再等 linger 秒，把这段时间里的记录合成一个事务写入
+    - 队列满了就丢弃并计数，历史记录不能拖慢、更不能影响起名本身
+    - 写入失败按指数退避重试，仍然失败就逐条写入，只丢掉写不进去的那几条
+    - 超出列长度的字段先截断，严格模式的 MySQL 不会因为一条超长记录拒绝整批
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 10000,
+        batch_size: int = 100,
+        linger: float = 0.5,
+        max_retries: int = 2,
+        retry_backoff: float = 0.5,
+    ):
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue: asyncio.Queue[tuple] = asyncio.Queue(maxsize=queue_size)
+        self._task: asyncio.Task | None = None
+        # 指标
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.write_total = 0.0
+        self.write_max = 0.0
+
+    def record(self, user_id: int, data: NameIn, names: list[NameSchema]) -> None:
+        # 时间在这里取，保证历史的顺序是响应的顺序，而不是落库的顺序
+        try:
+            self._queue.put_nowait((user_id, data, names, datetime.now()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        self.enqueued += 1
+
+    @staticmethod
+    def _to_model(user_id: int, data: NameIn, names: list[NameSchema], created_time: datetime) -> NameRequest:
+        return NameRequest(
+            user_id=user_id,
+            surname=_clip(data.surname, NameRequest.surname),
+            gender=data.gender,
+            length=data.length,
+            other=_clip(data.other or "", NameRequest.other),
+            exclude=data.exclude,
+            created_time=created_time,
+            candidates=[
+                NameCandidate(
+                    name=_clip(item.name, NameCandidate.name),
+                    reference=_clip(item.reference, NameCandidate.reference),
+                    moral=item.moral,
+                )
+                for item in names
+            ],
+        )
+
+    async def _insert(self, batch: list[tuple]) -> None:
+        start = time.monotonic()
+        async with AsyncSessionFactory() as session:
+            # 每次都重新构造对象，失败的那次已经和旧会话绑在一起了
+            await NameRepository(session).add_requests([self._to_model(*item) for item in batch])
+        elapsed = time.monotonic() - start
+        self.batches += 1
+        self.written += len(batch)
+        self.write_total += elapsed
+        self.write_max = max(self.write_max, elapsed)
+        stage_latency.observe(elapsed, "history.write")
+
+    async def _write(self, batch: list[tuple]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._insert(batch)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+        if len(batch) == 1:
+            self.failed += 1
+            logger.warning("起名记录写入失败，丢弃 1 条: %r", error)
+            return
+        # 整批写不进去多半是其中某一条有问题（数据错误），逐条写，只丢坏的
+        logger.warning("起名记录批量写入失败，改为逐条写入 %d 条: %r", len(batch), error)
+        for item in batch:
+            try:
+                await self._insert([item])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.warning("起名记录写入失败，丢弃 1 条: %r", e)
+
+    async def _worker(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.linger)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._worker())
+
+    async def stop(self, timeout: float = 10) -> None:
+        """尽量把队列里剩下的记录写完再退出"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("还有 %d 条起名记录没写入", self._queue.qsize())
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "write_avg": self.write_total / self.batches if self.batches else 0.0,
+            "write_max": self.write_max,
+        }
+
+
+def _clip(value: str | None, column) -> str | None:
+    """按列定义的长度截断字符串"""
+    length = column.type.length
+    if value is None or length is None:
+        return value
+    return value[:length]
+
+
+history_writer = HistoryWriter(
+    queue_size=settings.NAME_HISTORY_QUEUE_SIZE,
+    batch_size=settings.NAME_HISTORY_BATCH_SIZE,
+    linger=settings.NAME_HISTORY_LINGER,
+)
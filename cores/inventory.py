@@ -0,0 +1,158 @@
+# core/inventory.py
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Awaitable, Callable, Iterable
+
+from cores.cache import normalize_text
+from cores.name_filter import NameFilter
+from schemas.agent import NameResultSchema, NameSchema
+from schemas.name import NameIn
+
+logger = logging.getLogger(__name__)
+
+InventoryKey = tuple[str, str, str]
+
+
+class _Entry:
+    __slots__ = ("names", "updated")
+
+    def __init__(self, names: list[NameSchema]):
+        self.names = names
+        self.updated = time.time()
+
+
+class NameInventory:
+    """
+    预生成的名字库存：姓氏 × 性别 × 字数 的组合空间很小，热门组合提前生成好，
+    请求到来时直接从库存里随机取，毫秒级返回。
+
+    有 other（自定义要求）的请求不走库存；exclude 在取名字时过滤掉。
+    热度从请求记录里统计（record），并定期衰减，跟随最近的流量。
+    """
+
+    def __init__(self, top_k: int, names_per_key: int, ttl: int, serve_size: int = 5):
+        self.top_k = top_k
+        self.names_per_key = names_per_key
+        self.ttl = ttl
+        self.serve_size = serve_size
+        self._items: dict[InventoryKey, _Entry] = {}
+        self._demand: Counter[InventoryKey] = Counter()
+        self.hits = 0
+        self.misses = 0
+        self.bypass = 0
+
+    @staticmethod
+    def key_of(name_info: NameIn) -> InventoryKey | None:
+        if normalize_text(name_info.other):
+            return None
+        return normalize_text(name_info.surname), name_info.gender, name_info.length
+
+    def record(self, name_info: NameIn) -> None:
+        key = self.key_of(name_info)
+        if key is not None:
+            self._demand[key] += 1
+
+    def lookup(self, name_info: NameIn, avoid: Iterable[str] = ()) -> NameResultSchema | None:
+        key = self.key_of(name_info)
+        if key is None:
+            self.bypass += 1
+            return None
+        entry = self._items.get(key)
+        # 和模型结果一样过 NameFilter：exclude 里只写了名（不带姓）的也要排除
+        names = [] if entry is None else NameFilter(name_info, avoid).apply(entry.names)
+        if len(names) < self.serve_size:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return NameResultSchema(names=random.sample(names, self.serve_size))
+
+    def put(self, key: InventoryKey, names: list[NameSchema]) -> None:
+        self._items[key] = _Entry(names)
+
+    def has(self, key: InventoryKey) -> bool:
+        return key in self._items
+
+    def is_stale(self, key: InventoryKey) -> bool:
+        entry = self._items.get(key)
+        return entry is None or time.time() - entry.updated > self.ttl
+
+    def hot_keys(self) -> list[InventoryKey]:
+        return [key for key, _ in self._demand.most_common(self.top_k)]
+
+    def decay(self) -> None:
+        # 热度按比例衰减，冷下来的组合逐渐掉出 top_k
+        for key in list(self._demand):
+            self._demand[key] *= 0.9
+            if self._demand[key] < 1:
+                del self._demand[key]
+        # 已经不热门而且过期的库存直接丢掉
+        for key in list(self._items):
+            if key not in self._demand and self.is_stale(key):
+                del self._items[key]
+
+    async def fill(self, key: InventoryKey, generate: Callable[[NameIn], Awaitable[NameResultSchema]]) -> None:
+        """多调用几次模型，凑够 names_per_key 个不重复的名字"""
+        surname, gender, length = key
+        names: dict[str, NameSchema] = {}
+        # 最多多试两轮，防止模型一直给重复的名字
+        for _ in range(self.names_per_key // self.serve_size + 2):
+            result = await generate(NameIn(
+                surname=surname,
+                gender=gender,
+                length=length,
+                exclude=list(names),
+            ))
+            for item in result.names:
+                names.setdefault(item.name, item)
+            if len(names) >= self.names_per_key:
+                break
+        self.put(key, list(names.values()))
+
+    def stats(self) -> dict:
+        now = time.time()
+        ages = [now - entry.updated for entry in self._items.values()]
+        served = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypass": self.bypass,
+            "hit_rate": self.hits / served if served else 0.0,
+            "stale": sum(age > self.ttl for age in ages),
+            "age_avg": sum(ages) / len(ages) if ages else 0.0,
+            "age_max": max(ages, default=0.0),
+        }
+
+
+async def run_warmup_worker(
+    inventory: NameInventory,
+    generate: Callable[[NameIn], Awaitable[NameResultSchema]],
+    interval: float,
+    batch: int,
+    off_peak_hours: range,
+) -> None:
+    """
+    后台预热：每隔 interval 秒检查一次热门组合。
+    没有库存的组合随时补上；已有但过期的组合只在低峰时段刷新。
+    """
+    while True:
+        await asyncio.sleep(interval)
+        off_peak = datetime.now().hour in off_peak_hours
+        done = 0
+        for key in inventory.hot_keys():
+            if done >= batch:
+                break
+            if inventory.has(key) and not (off_peak and inventory.is_stale(key)):
+                continue
+            try:
+                await inventory.fill(key, generate)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("预生成名字失败 %s: %r", key, e)
+            done += 1
+        inventory.decay()
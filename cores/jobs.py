@@ -0,0 +1,36 @@
+# core/jobs.py
+import asyncio
+import logging
+
+import settings
+from models import AsyncSessionFactory
+from repository.user_repo import EmailCodeRepository
+
+logger = logging.getLogger(__name__)
+
+
+async def purge_email_codes() -> int:
+    """分批删掉所有过期验证码，返回总共删除的条数"""
+    total = 0
+    async with AsyncSessionFactory() as session:
+        repo = EmailCodeRepository(session)
+        while True:
+            deleted = await repo.purge_expired(settings.EMAIL_CODE_PURGE_BATCH)
+            total += deleted
+            if deleted < settings.EMAIL_CODE_PURGE_BATCH:
+                return total
+            # 批之间让出一下，给正常请求留出数据库资源
+            await asyncio.sleep(settings.EMAIL_CODE_PURGE_PAUSE)
+
+
+async def run_email_code_purger() -> None:
+    while True:
+        try:
+            deleted = await purge_email_codes()
+            if deleted:
+                logger.info("清理过期验证码 %d 条", deleted)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("清理过期验证码失败: %r", e)
+        await asyncio.sleep(settings.EMAIL_CODE_PURGE_INTERVAL)
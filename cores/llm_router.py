@@ -0,0 +1,236 @@
+# core/llm_router.py
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, TypeVar
+
+from cores.circuit import remaining, request_timeouts
+from cores.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+backend_attempts = registry.counter(
+    "llm_backend_attempts_total", "各模型后端的调用结果", ("backend", "result"),
+)
+
+
+class Backend:
+    """
+    一个模型后端（一个服务商或一个模型）。
+    llm 是 LangChain 的聊天模型；基于它构建的 agent 由调用方缓存在 agents 里。
+    """
+
+    def __init__(self, name: str, llm: Any, ewma_alpha: float = 0.2, window: int = 200):
+        self.name = name
+        self.llm = llm
+        self.agents: dict[Any, Any] = {}
+        self.ewma_alpha = ewma_alpha
+        # 最近成功调用的耗时，用来算对冲的 p95 截止时间
+        self._latencies: deque[float] = deque(maxlen=window)
+        self.latency_ewma: float | None = None
+        self.error_ewma = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def record_success(self, elapsed: float) -> None:
+        self.calls += 1
+        self._latencies.append(elapsed)
+        a = self.ewma_alpha
+        self.latency_ewma = elapsed if self.latency_ewma is None else (1 - a) * self.latency_ewma + a * elapsed
+        self.error_ewma = (1 - a) * self.error_ewma
+
+    def record_error(self) -> None:
+        self.calls += 1
+        self.errors += 1
+        a = self.ewma_alpha
+        self.error_ewma = (1 - a) * self.error_ewma + a
+
+    def quantile(self, q: float, min_samples: int = 20) -> float | None:
+        if len(self._latencies) < min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+    def score(self) -> float:
+        """越小越好：耗时 EWMA 按最近的出错率放大；还没调用过的后端排在前面，先试一试"""
+        if self.latency_ewma is None:
+            # 从来没成功过的排到最后，只在别的后端都失败时回退过去
+            return float("inf") if self.errors else 0.0
+        return self.latency_ewma / max(1 - self.error_ewma, 0.05)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "latency_ewma": self.latency_ewma or 0.0,
+            "error_ewma": self.error_ewma,
+            "p95": self.quantile(0.95, min_samples=1) or 0.0,
+        }
+
+
+class LLMRouter:
+    """
+    多后端路由：
+    - 优先用 score 最小（最快、最少出错）的后端
+    - 对冲：主请求超过该后端的 p95 还没返回，就向下一个后端再发一个，谁先成功用谁，另一个取消
+    - 回退：某个后端报错或超时，换下一个后端重试
+    只有一个后端时，对冲和回退都是向同一个后端再发一次。
+    对冲会多花 token，所以限制对冲次数不超过总调用的 max_hedge_ratio。
+    backends 也可以传一个返回后端列表的函数，第一次用到时才调用（模型客户端的导入和创建很慢）。
+    """
+
+    def __init__(
+        self,
+        backends: list[Backend] | Callable[[], list[Backend]],
+        timeout: float = 30,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 1.0,
+        hedge_default_delay: float = 10.0,
+        max_hedge_ratio: float = 0.1,
+    ):
+        self._loader = backends if callable(backends) else None
+        self._backends: list[Backend] | None = None
+        # 启动时可能在线程里预加载，和第一个请求同时触发时只加载一次
+        self._load_lock = threading.Lock()
+        if self._loader is None:
+            self.backends = backends
+        self.timeout = timeout
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.max_hedge_ratio = max_hedge_ratio
+        # 指标
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self.failures = 0
+
+    @property
+    def backends(self) -> list[Backend]:
+        if self._backends is None:
+            self.load()
+        return self._backends
+
+    @backends.setter
+    def backends(self, backends: list[Backend]) -> None:
+        if not backends:
+            raise ValueError("至少需要一个模型后端")
+        self._backends = backends
+
+    @property
+    def loaded(self) -> bool:
+        return self._backends is not None
+
+    def load(self) -> None:
+        with self._load_lock:
+            if self._backends is None:
+                self.backends = self._loader()
+
+    def ordered(self) -> list[Backend]:
+        # 分数一样时随机一下，避免没有数据时全部压到第一个后端
+        return sorted(self.backends, key=lambda b: (b.score(), random.random()))
+
+    def fastest(self) -> Backend:
+        return min(self.backends, key=Backend.score)
+
+    def hedge_delay(self, backend: Backend) -> float:
+        p = backend.quantile(self.hedge_quantile)
+        if p is None:
+            return self.hedge_default_delay
+        return max(p, self.hedge_min_delay)
+
+    def _can_hedge(self) -> bool:
+        return self.hedges < self.max_hedge_ratio * self.calls
+
+    async def _attempt(self, backend: Backend, call: Callable[[Backend], Awaitable[T]]) -> T:
+        start = time.monotonic()
+        # 不超过请求剩下的时间，用户都等不到了就没必要继续占着名额
+        timeout = remaining(self.timeout)
+        try:
+            if timeout <= 0:
+                raise asyncio.TimeoutError()
+            result = await asyncio.wait_for(call(backend), timeout)
+        except asyncio.CancelledError:
+            # 对冲输掉被取消的，不算成功也不算失败
+            backend_attempts.inc(1, backend.name, "cancelled")
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                request_timeouts.inc(1, "llm_attempt")
+            backend.record_error()
+            backend_attempts.inc(1, backend.name, "error")
+            raise
+        backend.record_success(time.monotonic() - start)
+        backend_attempts.inc(1, backend.name, "ok")
+        return result
+
+    async def invoke(self, call: Callable[[Backend], Awaitable[T]]) -> T:
+        """call(backend) 发起一次调用；返回最先成功的结果，所有后端都失败时抛出最后一个错误"""
+        self.calls += 1
+        candidates = self.ordered()
+        if len(candidates) == 1:
+            candidates = candidates * 2
+        pending: dict[asyncio.Future, Backend] = {}
+
+        def launch() -> asyncio.Future:
+            backend = candidates.pop(0)
+            task = asyncio.ensure_future(self._attempt(backend, call))
+            # 被取消的输家如果恰好先报了错，这里把异常取走，避免 "never retrieved" 警告
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            pending[task] = backend
+            return task
+
+        primary = launch()
+        deadline = time.monotonic() + self.hedge_delay(pending[primary])
+        hedged = False
+        hedge_task = None
+        last_error: BaseException | None = None
+        try:
+            while pending:
+                timeout = None
+                if not hedged and candidates:
+                    timeout = max(deadline - time.monotonic(), 0)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if self._can_hedge():
+                        self.hedges += 1
+                        hedge_task = launch()
+                    continue
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning("模型后端 %s 调用失败: %r", backend.name, last_error)
+                if not pending and candidates:
+                    self.fallbacks += 1
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        self.failures += 1
+        raise last_error
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+        }
+
+    def backend_stats(self) -> dict:
+        # 按后端分组，注册 collector 时用 backend 作为 label；还没加载时不要因为抓指标去加载
+        if not self.loaded:
+            return {}
+        return {backend.name: backend.stats() for backend in self._backends}
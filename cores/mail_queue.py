@@ -0,0 +1,205 @@
+# core/mail_queue.py
+import asyncio
+import logging
+import time
+from email.message import EmailMessage
+from email.utils import formataddr
+
+import aiosmtplib
+from fastapi import HTTPException
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
+
+import settings
+from cores.metrics import stage_latency
+
+logger = logging.getLogger(__name__)
+
+
+class _Connection:
+    """一个 worker 持有的 SMTP 长连接：断了或者空闲太久就重连"""
+
+    def __init__(self, dispatcher: "MailDispatcher"):
+        self.dispatcher = dispatcher
+        self.smtp: aiosmtplib.SMTP | None = None
+        self.last_used = 0.0
+
+    async def _open(self) -> aiosmtplib.SMTP:
+        d = self.dispatcher
+        smtp = aiosmtplib.SMTP(
+            hostname=d.hostname,
+            port=d.port,
+            username=d.username,
+            password=d.password,
+            use_tls=d.use_tls,
+            start_tls=d.start_tls,
+            validate_certs=d.validate_certs,
+        )
+        # connect 里会完成 STARTTLS 和登录，之后这个连接可以一直复用
+        await smtp.connect()
+        d.connections += 1
+        return smtp
+
+    async def send(self, message: EmailMessage) -> None:
+        now = time.monotonic()
+        if self.smtp is not None and (
+            not self.smtp.is_connected or now - self.last_used > self.dispatcher.idle_timeout
+        ):
+            await self.close()
+        if self.smtp is None:
+            self.smtp = await self._open()
+        await self.smtp.send_message(message)
+        self.last_used = time.monotonic()
+
+    async def close(self) -> None:
+        smtp, self.smtp = self.smtp, None
+        if smtp is None:
+            return
+        try:
+            await smtp.quit()
+        except Exception:
+            # QQ 邮箱在 QUIT 阶段经常返回畸形响应，连接反正都要丢掉了
+            smtp.close()
+
+
+class MailDispatcher:
+    """
+    异步发信：接口里只把邮件放进队列就返回，后台 worker 发送。
+    - 每个 worker 持有一个登录好的 SMTP 长连接，不用每封信都握手
+    - 队列里积压的邮件一次取一批，走同一个连接连续发送
+    - 发送失败按指数退避重试，重试前重建连接
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: str | None,
+        password: str | None,
+        sender: str,
+        use_tls: bool = False,
+        start_tls: bool | None = None,
+        validate_certs: bool = True,
+        workers: int = 2,
+        queue_size: int = 1000,
+        batch_size: int = 10,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        idle_timeout: float = 60,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.use_tls = use_tls
+        self.start_tls = start_tls
+        self.validate_certs = validate_certs
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+        self._queue: asyncio.Queue[EmailMessage] = asyncio.Queue(maxsize=queue_size)
+        self._tasks: list[asyncio.Task] = []
+        # 指标
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.connections = 0
+        self.send_total = 0.0
+        self.send_max = 0.0
+
+    def enqueue(self, recipient: str, subject: str, body: str) -> None:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.set_content(body)
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=HTTP_503_SERVICE_UNAVAILABLE,
+                detail="邮件服务繁忙，请稍后再试",
+                headers={"Retry-After": "10"},
+            )
+        self.enqueued += 1
+
+    async def _send(self, connection: _Connection, message: EmailMessage) -> None:
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            try:
+                await connection.send(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await connection.close()
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    logger.warning("邮件发送失败 %s: %r", message["To"], e)
+                    return
+                self.retried += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+                continue
+            elapsed = time.monotonic() - start
+            self.sent += 1
+            self.send_total += elapsed
+            self.send_max = max(self.send_max, elapsed)
+            stage_latency.observe(elapsed, "mail.send")
+            return
+
+    async def _worker(self) -> None:
+        connection = _Connection(self)
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                for message in batch:
+                    await self._send(connection, message)
+                    self._queue.task_done()
+        finally:
+            await connection.close()
+
+    def start(self) -> None:
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self, timeout: float = 10) -> None:
+        """尽量把队列里剩下的邮件发完再退出"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("还有 %d 封邮件没发出去", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "connections": self.connections,
+            "send_avg": self.send_total / self.sent if self.sent else 0.0,
+            "send_max": self.send_max,
+        }
+
+
+mail_dispatcher = MailDispatcher(
+    hostname=settings.MAIL_SERVER,
+    port=settings.MAIL_PORT,
+    username=settings.MAIL_USERNAME,
+    password=settings.MAIL_PASSWORD,
+    sender=formataddr((settings.MAIL_FROM_NAME, settings.MAIL_FROM)),
+    use_tls=settings.MAIL_SSL_TLS,
+    start_tls=settings.MAIL_STARTTLS,
+    workers=settings.MAIL_WORKERS,
+    queue_size=settings.MAIL_QUEUE_SIZE,
+    batch_size=settings.MAIL_BATCH_SIZE,
+    max_retries=settings.MAIL_MAX_RETRIES,
+)
@@ -0,0 +1,278 @@
+# core/metrics.py
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable
+
+# 默认的延迟分桶（秒），覆盖 JWT 这种亚毫秒级到 LLM 这种几十秒级
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """只增不减的计数，label 值按位置传：counter.inc(1, "POST", "/name")"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labels) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, self.labelnames, labels, value
+
+
+class Gauge(Counter):
+    """可以随意设置的值"""
+
+    type = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        self._values[labels] = value
+
+
+class Histogram:
+    """
+    固定分桶的直方图。observe 只做一次二分查找和几次加法，
+    累计（Prometheus 要求的 le 语义）放到导出时再算。
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [每个桶的计数..., +Inf 桶的计数, sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        data = self._values.get(labels)
+        if data is None:
+            data = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        data[bisect_left(self.buckets, value)] += 1
+        data[-1] += value
+
+    def count(self, *labels) -> int:
+        data = self._values.get(labels)
+        return sum(data[:-1]) if data else 0
+
+    def samples(self):
+        bucket_names = self.labelnames + ("le",)
+        for labels, data in self._values.items():
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), data):
+                total += count
+                yield self.name + "_bucket", bucket_names, labels + (_format_value(bound),), total
+            yield self.name + "_sum", self.labelnames, labels, data[-1]
+            yield self.name + "_count", self.labelnames, labels, total
+
+
+class Registry:
+    """
+    所有指标的集合，render() 输出 Prometheus 文本格式。
+    collector 是一个返回 stats 字典的函数（各个组件已有的 stats()），
+    只在抓取 /metrics 时调用，热路径上没有任何开销。
+    """
+
+    def __init__(self, prefix: str = "app"):
+        self.prefix = prefix
+        self._metrics: list = []
+        self._collectors: list[tuple[str, Callable[[], dict], str]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(f"{self.prefix}_{name}", documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(f"{self.prefix}_{name}", documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(f"{self.prefix}_{name}", documentation, labelnames, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, name: str, collect: Callable[[], dict], label: str = "name") -> None:
+        """
+        stats 里的每个数值导出成一个 gauge：{prefix}_{name}_{key}。
+        值是字典时（比如 pool_stats 的 primary/replica）用 label 区分。
+        """
+        self._collectors.append((f"{self.prefix}_{name}", collect, label))
+
+    def _collect(self):
+        for name, collect, label in self._collectors:
+            gauges: dict[str, list] = {}
+            for key, value in collect().items():
+                if isinstance(value, dict):
+                    for sub_key, sub_value in value.items():
+                        gauges.setdefault(sub_key, []).append(((label,), (key,), sub_value))
+                else:
+                    gauges.setdefault(key, []).append(((), (), value))
+            for key, samples in gauges.items():
+                yield f"{name}_{key}", "gauge", "", [
+                    (f"{name}_{key}", names, values, value)
+                    for names, values, value in samples
+                    if isinstance(value, (int, float))
+                ]
+
+    def render(self) -> str:
+        lines = []
+        families = [(m.name, m.type, m.documentation, m.samples()) for m in self._metrics]
+        for name, type_, documentation, samples in families + list(self._collect()):
+            if documentation:
+                lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {type_}")
+            for sample_name, names, values, value in samples:
+                lines.append(f"{sample_name}{_format_labels(names, values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP 请求数", ("method", "route", "status"),
+)
+http_latency = registry.histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时（按路由模板）", ("method", "route"),
+)
+stage_latency = registry.histogram(
+    "stage_duration_seconds", "请求内部各阶段耗时", ("stage",),
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total", "LLM token 用量", ("type",),
+)
+
+# 当前请求的 ASGI scope，路由匹配后 scope["route"] 才有值
+_current_scope: ContextVar[dict | None] = ContextVar("current_scope", default=None)
+
+
+def current_endpoint() -> str | None:
+    """当前请求的路由模板（如 /batch/{job_id}），不在请求里时返回 None"""
+    scope = _current_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path")
+
+
+class span:
+    """
+    记录一段代码的耗时：with span("name.llm"): ...
+    用类而不是 @contextmanager，少一层生成器，每次只有一两微秒开销
+    """
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        stage_latency.observe(time.perf_counter() - self.start, self.stage)
+        return False
+
+
+def timed(stage: str):
+    """给 async 函数整体计时的装饰器"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                stage_latency.observe(time.perf_counter() - start, stage)
+        return wrapper
+    return decorator
+
+
+def record_llm_usage(usage: dict | None) -> None:
+    """累加 LangChain 的 usage_metadata（input_tokens/output_tokens）"""
+    if not usage:
+        return
+    llm_tokens.inc(usage.get("input_tokens", 0), "input")
+    llm_tokens.inc(usage.get("output_tokens", 0), "output")
+    cached = (usage.get("input_token_details") or {}).get("cache_read")
+    if cached:
+        llm_tokens.inc(cached, "cache_read")
+
+
+class MetricsMiddleware:
+    """
+    纯 ASGI 中间件（不用 BaseHTTPMiddleware，避免每个请求多一层 task 和流式响应被缓冲）。
+    按路由模板打标签，/name/batch/abc 和 /name/batch/def 记在同一条时间序列上。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _current_scope.set(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_scope.reset(token)
+            route = scope.get("route")
+            # 没匹配上路由的（404 扫描）合并成一条，防止标签爆炸
+            path = getattr(route, "path", None) or "<unmatched>"
+            http_requests.inc(1, scope["method"], path, status)
+            http_latency.observe(elapsed, scope["method"], path)
@@ -0,0 +1,77 @@
+# core/name_filter.py
+from typing import Iterable
+
+from cores.cache import LRUCache, normalize_text
+from schemas.agent import NameSchema
+from schemas.name import NameIn
+
+# 每次返回的候选数量
+CANDIDATE_COUNT = 5
+
+
+class NameFilter:
+    """
+    校验模型返回的名字：必须以姓氏开头且不止一个姓，不能在 exclude 里，
+    不能和已经收下的、或者 avoid（比如给这个用户推荐过的）名字重复。
+    exclude 里既可能写全名也可能只写名，两种都比对。
+    """
+
+    def __init__(self, name_info: NameIn, avoid: Iterable[str] = ()):
+        self.surname = normalize_text(name_info.surname)
+        self.excluded = ({normalize_text(name) for name in name_info.exclude} | set(avoid)) - {""}
+        self.seen: set[str] = set()
+        self.rejected = 0
+
+    def accept(self, item: NameSchema) -> bool:
+        name = normalize_text(item.name)
+        given = name[len(self.surname):] if name.startswith(self.surname) else ""
+        if not given or name in self.excluded or given in self.excluded or name in self.seen:
+            self.rejected += 1
+            return False
+        self.seen.add(name)
+        return True
+
+    def apply(self, names: Iterable[NameSchema]) -> list[NameSchema]:
+        return [item for item in names if self.accept(item)]
+
+    def blocked(self) -> list[str]:
+        """补充生成时告诉模型不要再给的名字"""
+        return sorted(self.excluded | self.seen)
+
+
+class ServedNames:
+    """记录最近推荐给每个用户的名字，同一个用户再来要名字时不给重复的"""
+
+    def __init__(self, max_users: int, per_user: int, ttl: int):
+        self.per_user = per_user
+        self._users = LRUCache(max_users, ttl)
+
+    def get(self, user_id: int | None) -> list[str]:
+        if user_id is None:
+            return []
+        return self._users.get(user_id, [])
+
+    def add(self, user_id: int | None, names: Iterable[NameSchema]) -> None:
+        if user_id is None:
+            return
+        served = self.get(user_id) + [normalize_text(item.name) for item in names]
+        self._users.set(user_id, served[-self.per_user:])
+
+
+class FilterStats:
+    """过滤和补充生成的统计：平均每次响应用了几次补充调用"""
+
+    def __init__(self):
+        self.responses = 0
+        self.checked = 0
+        self.rejected = 0
+        self.topup_calls = 0
+
+    def stats(self) -> dict:
+        return {
+            "responses": self.responses,
+            "checked": self.checked,
+            "rejected": self.rejected,
+            "topup_calls": self.topup_calls,
+            "topups_per_response": self.topup_calls / self.responses if self.responses else 0.0,
+        }
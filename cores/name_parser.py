@@ -0,0 +1,191 @@
+# core/name_parser.py
+import json
+from typing import Any
+
+from pydantic import ValidationError
+
+from cores.metrics import registry
+from schemas.agent import NameBatchResultSchema, NameGroupSchema, NameResultSchema, NameSchema
+
+json_repairs = registry.counter(
+    "llm_json_repairs_total", "模型返回的 JSON 本地修补的结果", ("result",),
+)
+
+# 模型偶尔会用中文字段名输出
+_KEY_ALIASES = {
+    "姓名": "name",
+    "出处": "reference",
+    "寓意": "moral",
+}
+
+
+def to_name_schema(data: dict) -> NameSchema | None:
+    """把一个候选 dict 转成 NameSchema，字段不全时返回 None"""
+    if not isinstance(data, dict):
+        return None
+    data = {_KEY_ALIASES.get(key, key): value for key, value in data.items()}
+    try:
+        return NameSchema.model_validate(data)
+    except ValidationError:
+        return None
+
+
+class NameStreamParser:
+    """
+    增量解析模型流式输出的 JSON：{"names": [{...}, {...}]}
+
+    每次 feed 一段文本，返回这段文本里新闭合的候选对象。
+    只要是直接位于数组里的对象就当成一个候选，所以顶层直接输出数组、
+    或者前后带 ```json 代码块标记也能解析。
+    """
+
+    def __init__(self):
+        self._buffer: list[str] = []
+        # 括号栈，只记录 { 和 [
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        # 当前候选对象在 buffer 中的起始位置
+        self._start: int | None = None
+        self._pos = 0
+
+    def feed(self, chunk: str) -> list[NameSchema]:
+        results = []
+        for char in chunk:
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = self._stack != []
+            elif char in "{[":
+                if char == "{" and self._stack and self._stack[-1] == "[" and self._start is None:
+                    self._start = self._pos
+                self._stack.append(char)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if char == "}" and self._start is not None and self._stack and self._stack[-1] == "[":
+                    text = "".join(self._buffer[self._start:self._pos + 1])
+                    self._start = None
+                    try:
+                        item = to_name_schema(json.loads(text))
+                    except json.JSONDecodeError:
+                        item = None
+                    if item is not None:
+                        results.append(item)
+            self._pos += 1
+        return results
+
+
+def repair_json(text: str) -> list[str]:
+    """
+    修补模型输出 JSON 的常见小毛病，不用让模型重新生成，返回按顺序尝试的候选文本：
+    - 前后的说明文字、```json 代码块标记：只保留第一个 { 或 [ 开始的那个值
+    - 对象/数组末尾多余的逗号
+    - 输出被截断：补上没闭合的字符串和括号；截断在半个键值对上时，退回到最后一个完整的对象/数组
+    """
+    starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+    if not starts:
+        return []
+    out: list[str] = []
+    stack: list[str] = []
+    in_string = False
+    escape = False
+    # 最后一个完整闭合的嵌套值之后的位置和当时的括号栈
+    checkpoint: tuple[int, list[str]] | None = None
+    for char in text[min(starts):]:
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+            out.append(char)
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            out.append(char)
+        elif char in "}]":
+            if not stack:
+                break
+            # 去掉 } ] 前面多余的逗号
+            while out and out[-1] in " \t\r\n,":
+                out.pop()
+            out.append(stack.pop())
+            if not stack:
+                # 顶层已经闭合，后面是说明文字或代码块标记
+                return ["".join(out)]
+            checkpoint = (len(out), stack.copy())
+        else:
+            out.append(char)
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    candidates = ["".join(out).rstrip(" \t\r\n,") + "".join(reversed(stack))]
+    if checkpoint is not None:
+        length, opened = checkpoint
+        candidates.append("".join(out[:length]) + "".join(reversed(opened)))
+    return candidates
+
+
+def loads_tolerant(text: str) -> Any:
+    """先按标准 JSON 解析，失败了在本地修补后再解析；还不行返回 None"""
+    try:
+        return json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        pass
+    for candidate in repair_json(text):
+        try:
+            data = json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            continue
+        json_repairs.inc(1, "repaired")
+        return data
+    json_repairs.inc(1, "failed")
+    return None
+
+
+def _to_names(items: Any) -> list[NameSchema]:
+    if not isinstance(items, list):
+        return []
+    return [item for item in map(to_name_schema, items) if item is not None]
+
+
+def parse_name_result(text: str) -> NameResultSchema | None:
+    """
+    解析 {"names": [...]}（或者直接是数组），字段不全的候选跳过。
+    整体解析不了时，像流式那样把已经完整的候选对象一个个捞出来。
+    """
+    data = loads_tolerant(text)
+    names = _to_names(data.get("names") if isinstance(data, dict) else data)
+    if not names:
+        names = NameStreamParser().feed(text)
+        if names:
+            json_repairs.inc(1, "salvaged")
+    return NameResultSchema(names=names) if names else None
+
+
+def parse_batch_result(text: str) -> NameBatchResultSchema | None:
+    """解析 {"groups": [{"index": 0, "names": [...]}]}，编号缺失或不是数字的组跳过"""
+    data = loads_tolerant(text)
+    groups = data.get("groups") if isinstance(data, dict) else data
+    if not isinstance(groups, list):
+        return None
+    result = []
+    for group in groups:
+        if not isinstance(group, dict):
+            continue
+        try:
+            index = int(group.get("index"))
+        except (TypeError, ValueError):
+            continue
+        result.append(NameGroupSchema(index=index, names=_to_names(group.get("names"))))
+    return NameBatchResultSchema(groups=result) if result else None
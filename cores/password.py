@@ -0,0 +1,42 @@
+# core/password.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from pwdlib import PasswordHash
+
+import settings
+
+# 下载密码加密包
+# pip install "pwdlib[argon2]"
+
+password_hash = PasswordHash.recommended()
+
+
+class PasswordService:
+    """
+    Argon2 哈希/校验放到有界线程池里执行，不阻塞事件循环。
+    argon2-cffi 计算时会释放 GIL，所以线程池就能真正并行。
+    """
+
+    def __init__(self, max_workers: int, hasher: PasswordHash = password_hash):
+        self.hasher = hasher
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password")
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.hasher.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self.hasher.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """
+        校验密码；如果哈希参数已经变了（比如调高了 Argon2 的成本），
+        顺便返回用新参数算出的哈希，调用方存回数据库即可
+        """
+        return await self._run(self.hasher.verify_and_update, password, hashed)
+
+
+password_service = PasswordService(max_workers=settings.PASSWORD_HASH_WORKERS)
@@ -0,0 +1,194 @@
+# core/rate_limit.py
+import math
+import time
+from typing import Callable
+
+from fastapi import Depends, HTTPException, Request
+from starlette.status import HTTP_429_TOO_MANY_REQUESTS
+
+import settings
+from cores.cache import KVStore, LRUCache, kv_store
+from cores.metrics import registry
+
+rate_limit_rejected = registry.counter(
+    "rate_limit_rejected_total", "被限流拒绝的请求", ("rule",),
+)
+
+
+def _retry_after(limit: int, window: float, previous: int, current: int, offset: float) -> float:
+    """
+    滑动窗口的近似估计：上个窗口的次数 × 它还落在滑动窗口里的比例 + 当前窗口的次数。
+    current 是这次请求之前的次数；允许返回 0，否则返回还要等多少秒
+    """
+    if previous * (1 - offset / window) + current + 1 <= limit:
+        return 0.0
+    if current + 1 > limit:
+        # 当前窗口自己就满了，至少要等到下一个窗口
+        return window - offset
+    # 等上个窗口的权重降到够再放一次
+    return (1 - (limit - current - 1) / previous) * window - offset
+
+
+class SlidingWindow:
+    """
+    进程内的滑动窗口计数：每个 key 只存 [窗口编号, 上个窗口的次数, 当前窗口的次数]，
+    不用记每次请求的时间戳。key 数量有上限，两个窗口没动静的 key 自动过期。
+    只有放行的请求计数，被拒绝的不会把自己越锁越久。
+    """
+
+    def __init__(self, limit: int, window: float, max_keys: int):
+        self.limit = limit
+        self.window = window
+        self._counts = LRUCache(maxsize=max_keys, ttl=window * 2)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    async def hit(self, key: str) -> float:
+        index, offset = divmod(time.monotonic(), self.window)
+        state = self._counts.get(key)
+        if state is None:
+            state = [index, 0, 0]
+            self._counts.set(key, state)
+        elif state[0] != index:
+            state[1] = state[2] if state[0] == index - 1 else 0
+            state[2] = 0
+            state[0] = index
+            # 顺便续上过期时间
+            self._counts.set(key, state)
+        wait = _retry_after(self.limit, self.window, state[1], state[2], offset)
+        if not wait:
+            state[2] += 1
+        return wait
+
+
+class KVSlidingWindow:
+    """
+    多个 worker 共用的滑动窗口计数：每个窗口一个计数 key（INCR + EXPIRE），
+    和 Redis 兼容。先加一再判断，所以被拒绝的请求也会计数。
+    """
+
+    def __init__(self, store: KVStore, prefix: str, limit: int, window: float):
+        self.store = store
+        self.prefix = prefix
+        self.limit = limit
+        self.window = window
+        self._ttl = math.ceil(window * 2)
+
+    def __len__(self) -> int:
+        # key 在共享存储里，这里数不出来
+        return 0
+
+    async def hit(self, key: str) -> float:
+        # 多进程之间要对齐窗口，用墙上时间
+        index, offset = divmod(time.time(), self.window)
+        index = int(index)
+        current_key = f"{self.prefix}:{key}:{index}"
+        current = await self.store.incr(current_key)
+        if current == 1:
+            await self.store.expire(current_key, self._ttl)
+        previous = int(await self.store.get(f"{self.prefix}:{key}:{index - 1}") or 0)
+        return _retry_after(self.limit, self.window, previous, current - 1, offset)
+
+
+class RateLimiter:
+    """
+    一条限流规则：同一个 key 在 window 秒内最多 limit 次，超出返回 429 + Retry-After。
+    默认每个进程各自计数；RATE_LIMIT_BACKEND=kv 时走共享的 kv_store（配 Redis 后多 worker 共用额度）
+    """
+
+    def __init__(self, name: str, limit: int, window: float, backend: KVStore | None = None, max_keys: int = 100000):
+        self.name = name
+        if backend is None:
+            self.counter = SlidingWindow(limit, window, max_keys)
+        else:
+            self.counter = KVSlidingWindow(backend, f"rate:{name}", limit, window)
+        # 指标
+        self.allowed = 0
+        self.rejected = 0
+
+    async def hit(self, key: str) -> None:
+        wait = await self.counter.hit(key)
+        if not wait:
+            self.allowed += 1
+            return
+        self.rejected += 1
+        rate_limit_rejected.inc(1, self.name)
+        raise HTTPException(
+            status_code=HTTP_429_TOO_MANY_REQUESTS,
+            detail="请求太频繁，请稍后再试",
+            headers={"Retry-After": str(max(math.ceil(wait), 1))},
+        )
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self.counter),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+def client_ip(request: Request) -> str:
+    # 部署在反向代理后面时，要打开 RATE_LIMIT_TRUST_PROXY 才取 X-Forwarded-For，否则客户端可以随便伪造
+    if settings.RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",", 1)[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+# 下面几个函数返回 FastAPI 依赖，挂在路由的 dependencies 上，会在查库、发信、算哈希之前执行
+
+def by_ip(limiter: RateLimiter) -> Callable:
+    async def dependency(request: Request) -> None:
+        if settings.RATE_LIMIT_ENABLED:
+            await limiter.hit(client_ip(request))
+    return dependency
+
+
+def by_email(limiter: RateLimiter, source: str = "query") -> Callable:
+    """source=query 从查询参数取 email，source=body 从 JSON 请求体取（FastAPI 已经解析过，有缓存）"""
+
+    async def dependency(request: Request) -> None:
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        if source == "query":
+            email = request.query_params.get("email")
+        else:
+            try:
+                body = await request.json()
+            except ValueError:
+                return
+            email = body.get("email") if isinstance(body, dict) else None
+        # 没有 email 的请求交给参数校验去报 422
+        if isinstance(email, str) and email:
+            await limiter.hit(email.strip().lower())
+    return dependency
+
+
+def by_user(limiter: RateLimiter, auth_dependency: Callable) -> Callable:
+    """auth_dependency 和接口用的是同一个时，FastAPI 在一个请求里只执行一次"""
+
+    async def dependency(user_id: int = Depends(auth_dependency)) -> None:
+        if settings.RATE_LIMIT_ENABLED:
+            await limiter.hit(str(user_id))
+    return dependency
+
+
+def _create_limiter(name: str, rule: tuple[int, float]) -> RateLimiter:
+    backend = kv_store if settings.RATE_LIMIT_BACKEND == "kv" else None
+    return RateLimiter(name, *rule, backend=backend, max_keys=settings.RATE_LIMIT_MAX_KEYS)
+
+
+code_ip_limiter = _create_limiter("code_ip", settings.RATE_LIMIT_CODE_PER_IP)
+code_email_limiter = _create_limiter("code_email", settings.RATE_LIMIT_CODE_PER_EMAIL)
+login_ip_limiter = _create_limiter("login_ip", settings.RATE_LIMIT_LOGIN_PER_IP)
+login_email_limiter = _create_limiter("login_email", settings.RATE_LIMIT_LOGIN_PER_EMAIL)
+name_user_limiter = _create_limiter("name_user", settings.RATE_LIMIT_NAME_PER_USER)
+
+_limiters = [code_ip_limiter, code_email_limiter, login_ip_limiter, login_email_limiter, name_user_limiter]
+
+
+def rate_limit_stats() -> dict:
+    # 按规则分组，注册 collector 时用 rule 作为 label
+    return {limiter.name: limiter.stats() for limiter in _limiters}
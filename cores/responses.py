@@ -0,0 +1,44 @@
+# core/responses.py
+import json
+from typing import Any
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+import settings
+
+# 可选依赖：非 pydantic 的内容用 orjson 序列化更快，需要 pip install orjson；没装时用标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    pydantic 模型直接用 model_dump_json 序列化（Rust 实现，不经过 dict 和 jsonable_encoder），
+    其他内容用 orjson，没装 orjson 时退回标准库 json
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json().encode()
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def respond(content: BaseModel, response: Response | None = None, status_code: int = 200) -> Any:
+    """
+    FAST_JSON_RESPONSES 打开时直接返回序列化好的响应：FastAPI 不会再按 response_model 校验一遍、
+    也不会走 jsonable_encoder。所以 content 必须是可信的、已经是 response_model 类型的对象
+    （一般用 model_construct 构造）。response 是接口里注入的 Response，设置过的响应头会带上。
+    没打开时原样返回，由 FastAPI 按 response_model 处理。
+    """
+    if not settings.FAST_JSON_RESPONSES:
+        return content
+    fast = FastJSONResponse(content, status_code=status_code)
+    if response is not None:
+        fast.headers.raw.extend(response.headers.raw)
+    return fast
@@ -0,0 +1,188 @@
+# core/scheduler.py
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from fastapi import HTTPException
+from starlette.status import HTTP_429_TOO_MANY_REQUESTS, HTTP_503_SERVICE_UNAVAILABLE
+
+from cores.metrics import stage_latency
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """令牌桶：rate 为每秒补充的令牌数，capacity 为允许的突发量；rate <= 0 表示不限速"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """拿到令牌返回 0，否则返回还需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class LLMScheduler:
+    """
+    大模型调用调度器：
+    - 全局并发上限 max_concurrency
+    - 令牌桶限速，对齐服务商的 QPS/RPM 配额
+    - 按 user_id 轮询出队，单个用户刷请求不会饿死其他用户
+    - 有界队列：单用户排队过多返回 429，总队列满返回 503，都带 Retry-After
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        rate: float,
+        burst: float,
+        max_queue: int,
+        max_queue_per_user: int,
+    ):
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self._running = 0
+        # user_id -> 该用户排队中的 future；OrderedDict 的顺序就是轮询顺序
+        self._queues: OrderedDict[Hashable, deque[asyncio.Future]] = OrderedDict()
+        self._queued = 0
+        self._timer: asyncio.TimerHandle | None = None
+        # 指标
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.exec_total = 0.0
+        self.exec_max = 0.0
+
+    def _retry_after(self) -> int:
+        avg_exec = self.exec_total / self.completed if self.completed else 1.0
+        by_rate = self._queued / self.bucket.rate if self.bucket.rate > 0 else 0.0
+        by_slots = self._queued * avg_exec / self.max_concurrency
+        return max(1, math.ceil(max(by_rate, by_slots)))
+
+    def _reject(self, status_code: int, detail: str):
+        self.rejected += 1
+        raise HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self._retry_after())},
+        )
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._queued and self._running < self.max_concurrency:
+            wait = self.bucket.try_acquire()
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(wait, self._on_timer)
+                return
+            user_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self._queued -= 1
+            if queue:
+                # 这个用户还有请求，排到最后，轮到下一个用户
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            if future.cancelled():
+                continue
+            self._running += 1
+            future.set_result(None)
+
+    def _remove(self, user_id: Hashable, future: asyncio.Future) -> None:
+        queue = self._queues.get(user_id)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        self._queued -= 1
+        if not queue:
+            del self._queues[user_id]
+
+    def _release(self) -> None:
+        self._running -= 1
+        self._dispatch()
+
+    async def _acquire(self, user_id: Hashable) -> None:
+        self.submitted += 1
+        enqueued = time.monotonic()
+        # 没人排队时直接放行，不经过队列
+        if not self._queues and self._running < self.max_concurrency and self.bucket.try_acquire() == 0:
+            self._running += 1
+            # 没排队也要记一次 0，否则排队耗时的分布只剩下排过队的请求
+            stage_latency.observe(0.0, "llm.queue")
+            return
+        queue = self._queues.get(user_id)
+        if queue is not None and len(queue) >= self.max_queue_per_user:
+            self._reject(HTTP_429_TOO_MANY_REQUESTS, "请求太频繁，请稍后再试")
+        if self._queued >= self.max_queue:
+            self._reject(HTTP_503_SERVICE_UNAVAILABLE, "服务繁忙，请稍后再试")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append(future)
+        self._queued += 1
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已经分到名额但调用方被取消了，把名额还回去
+                self._release()
+            else:
+                self._remove(user_id, future)
+            raise
+        wait = time.monotonic() - enqueued
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        stage_latency.observe(wait, "llm.queue")
+
+    @asynccontextmanager
+    async def slot(self, user_id: Hashable = None):
+        """占用一个调用名额，流式调用这类不方便包成函数的场景用"""
+        await self._acquire(user_id)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self.completed += 1
+            self.exec_total += elapsed
+            self.exec_max = max(self.exec_max, elapsed)
+            self._release()
+
+    async def run(self, user_id: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        async with self.slot(user_id):
+            return await func()
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "queued": self._queued,
+            "users_waiting": len(self._queues),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "wait_avg": self.wait_total / self.submitted if self.submitted else 0.0,
+            "wait_max": self.wait_max,
+            "exec_avg": self.exec_total / self.completed if self.completed else 0.0,
+            "exec_max": self.exec_max,
+        }
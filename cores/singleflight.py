@@ -0,0 +1,66 @@
+# core/singleflight.py
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    合并并发的相同请求：同一个 key 同一时间只执行一次，其余请求（follower）
+    等待第一个请求（leader）的结果。
+
+    真正的调用跑在独立的 Task 里，所有调用方都通过 asyncio.shield 等待，
+    所以 leader 断开连接被取消时，调用本身不会被取消，follower 照常拿到结果。
+    每个 key 记着还有几个调用方在等，最后一个也取消时才取消调用本身，不再白白占着模型。
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._waiters: dict[str, int] = {}
+        # 实际发起的调用次数
+        self.calls = 0
+        # 搭便车的请求数，也就是省下的调用次数
+        self.shared = 0
+        # 所有调用方都走了、被取消的调用
+        self.abandoned = 0
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+        # 所有调用方都已经取消时，取走异常，避免 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t: self._done(key, t))
+            self.calls += 1
+        else:
+            self.shared += 1
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._inflight.get(key) is task and not task.done():
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0:
+                    # 最后一个等待的也走了：放掉占位，取消调用
+                    del self._inflight[key]
+                    del self._waiters[key]
+                    task.cancel()
+                    self.abandoned += 1
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "abandoned": self.abandoned,
+            "inflight": len(self._inflight),
+        }
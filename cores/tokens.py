@@ -0,0 +1,171 @@
+# core/tokens.py
+import re
+from contextvars import ContextVar
+from typing import Hashable
+
+import settings
+from cores.cache import LRUCache
+from cores.metrics import current_endpoint, record_llm_usage, registry
+
+endpoint_tokens = registry.counter(
+    "llm_endpoint_tokens_total", "按接口统计的 LLM token 用量", ("endpoint", "type"),
+)
+endpoint_llm_latency = registry.histogram(
+    "llm_call_duration_seconds", "按接口统计的单次模型调用耗时", ("endpoint",),
+)
+prompt_truncated = registry.counter(
+    "prompt_truncated_total", "超出 token 预算被截断的字段", ("field",),
+)
+
+_CJK = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+
+
+def estimate_tokens(text: str) -> float:
+    """
+    粗略估算 token 数（DeepSeek 的分词器：一个汉字约 0.6 token，其他字符约 0.3），
+    只用来做预算，真实用量以模型返回的 usage_metadata 为准
+    """
+    if not text:
+        return 0.0
+    cjk = len(_CJK.findall(text))
+    return cjk * 0.6 + (len(text) - cjk) * 0.3
+
+
+def truncate_text(text: str | None, budget: float) -> str:
+    """截到预算以内，保留开头（用户一般把最重要的要求写在前面）"""
+    if not text or estimate_tokens(text) <= budget:
+        return text or ""
+    used = 0.0
+    for index, char in enumerate(text):
+        used += 0.6 if _CJK.match(char) else 0.3
+        if used > budget:
+            prompt_truncated.inc(1, "other")
+            return text[:index]
+    return text
+
+
+def fit_names(names: list[str], budget: float) -> str:
+    """
+    排除列表在预算内尽量多放，放不下的只写一个数量。
+    没写进 prompt 的名字仍然会被 NameFilter 过滤掉，只是可能多一轮补充生成。
+    """
+    unique = [name for name in dict.fromkeys(name.strip() for name in names) if name]
+    kept = []
+    used = 0.0
+    for name in unique:
+        cost = estimate_tokens(name) + 0.6
+        if used + cost > budget:
+            break
+        kept.append(name)
+        used += cost
+    text = "、".join(kept)
+    omitted = len(unique) - len(kept)
+    if omitted > 0:
+        prompt_truncated.inc(1, "exclude")
+        text += f"等（另有 {omitted} 个）"
+    return text
+
+
+class Usage:
+    """一段时间内的 token 用量和模型耗时"""
+
+    __slots__ = ("calls", "input_tokens", "output_tokens", "cache_read_tokens", "llm_seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.llm_seconds = 0.0
+
+    def add(self, usage: dict | None, elapsed: float) -> None:
+        self.calls += 1
+        self.llm_seconds += elapsed
+        if usage:
+            self.input_tokens += usage.get("input_tokens", 0)
+            self.output_tokens += usage.get("output_tokens", 0)
+            self.cache_read_tokens += (usage.get("input_token_details") or {}).get("cache_read") or 0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "llm_seconds": self.llm_seconds,
+        }
+
+    def header(self) -> str:
+        return (f"calls={self.calls};input={self.input_tokens};output={self.output_tokens};"
+                f"cache_read={self.cache_read_tokens};llm_ms={round(self.llm_seconds * 1000)}")
+
+
+def merge_usage(messages) -> dict | None:
+    """agent 一次调用里可能有好几条 AI 消息（结构化输出会多一轮），把用量加起来"""
+    total: dict | None = None
+    for message in messages:
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            continue
+        if total is None:
+            total = {"input_tokens": 0, "output_tokens": 0, "input_token_details": {"cache_read": 0}}
+        total["input_tokens"] += usage.get("input_tokens", 0)
+        total["output_tokens"] += usage.get("output_tokens", 0)
+        total["input_token_details"]["cache_read"] += (
+            (usage.get("input_token_details") or {}).get("cache_read") or 0
+        )
+    return total
+
+
+# 当前请求的用量；run_batch、singleflight 里新建的 task 会复制上下文，记到同一个对象上
+_request: ContextVar[tuple[Hashable, Usage] | None] = ContextVar("llm_request_usage", default=None)
+
+
+class TokenLedger:
+    """
+    token 记账：每次模型调用同时记到 当前请求 / 用户 / 接口 三个维度。
+    - 请求：begin() 返回的 Usage，接口可以把它放进响应里
+    - 用户：LRU 里保留最近活跃用户的累计用量
+    - 接口：Prometheus 计数器和耗时直方图
+    singleflight 合并的调用只记在真正发起调用的那个请求上。
+    """
+
+    def __init__(self, max_users: int):
+        self.by_user = LRUCache(maxsize=max_users)
+        self.by_endpoint: dict[str, Usage] = {}
+
+    def begin(self, user_id: Hashable = None) -> Usage:
+        usage = Usage()
+        _request.set((user_id, usage))
+        return usage
+
+    def record(self, usage: dict | None, elapsed: float) -> None:
+        record_llm_usage(usage)
+        endpoint = current_endpoint() or "background"
+        self.by_endpoint.setdefault(endpoint, Usage()).add(usage, elapsed)
+        endpoint_llm_latency.observe(elapsed, endpoint)
+        if usage:
+            endpoint_tokens.inc(usage.get("input_tokens", 0), endpoint, "input")
+            endpoint_tokens.inc(usage.get("output_tokens", 0), endpoint, "output")
+
+        current = _request.get()
+        if current is None:
+            return
+        user_id, request_usage = current
+        request_usage.add(usage, elapsed)
+        if user_id is not None:
+            user_usage = self.by_user.get(user_id)
+            if user_usage is None:
+                user_usage = Usage()
+                self.by_user.set(user_id, user_usage)
+            user_usage.add(usage, elapsed)
+
+    def user_usage(self, user_id: Hashable) -> Usage | None:
+        return self.by_user.get(user_id)
+
+    def stats(self) -> dict:
+        # 按接口分组，注册 collector 时用 endpoint 作为 label
+        return {endpoint: usage.to_dict() for endpoint, usage in self.by_endpoint.items()}
+
+
+token_ledger = TokenLedger(max_users=settings.LLM_USAGE_MAX_USERS)
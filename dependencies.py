@@ -1,13 +1,30 @@
+from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from cores.mail import create_mail_instance
-from fastapi_mail import FastMail
+import settings
+from cores.cache import kv_store
+from models import AsyncSessionFactory, ReadSessionFactory
+from repository.code_store import CodeStore, KVCodeStore, SqlCodeStore
+from repository.user_repo import EmailCodeRepository
 
-from models import AsyncSessionFactory
+kv_code_store = KVCodeStore(
+    kv_store,
+    ttl=settings.EMAIL_CODE_TTL,
+    max_attempts=settings.EMAIL_CODE_MAX_ATTEMPTS,
+)
 
 
-async def get_mail() -> FastMail:
-    return create_mail_instance()
+# FastMail 只保存配置，可以复用，不用每个请求都重新创建；
+# fastapi_mail 导入很慢，第一次用到时才创建
+_mail = None
+
+
+async def get_mail():
+    global _mail
+    if _mail is None:
+        from cores.mail import create_mail_instance
+        _mail = create_mail_instance()
+    return _mail
 
 # 操作数据库，邮件应该放到redis里才合理
 async def get_session() -> AsyncSession:
@@ -18,3 +35,17 @@ async def get_session() -> AsyncSession:
         await session.close()
 
 
+# 只读查询走从库（没配置从库时就是主库），注意从库可能有复制延迟
+async def get_read_session() -> AsyncSession:
+    session = ReadSessionFactory()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def get_code_store(session: AsyncSession = Depends(get_session)) -> CodeStore:
+    # session 只是个对象，kv 后端用不到它时不会连接数据库
+    if settings.CODE_STORE_BACKEND == "sql":
+        return SqlCodeStore(EmailCodeRepository(session))
+    return kv_code_store
@@ -1,5 +1,7 @@
-from fastapi import FastAPI, Depends
-from fastapi_mail import FastMail,MessageSchema,MessageType
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, Response
 
 from dependencies import get_mail
 
@@ -7,12 +9,69 @@ from aiosmtplib import SMTPResponseException
 
 from routers.auth_router import router as auth_router
 from routers.name_router import router as name_router
+from cores.agent import (
+    filter_stats, llm_router, llm_scheduler, name_breaker, name_cache, name_flight, name_inventory, run_inventory_worker,
+)
+from cores.history import history_writer
+from cores.mail_queue import mail_dispatcher
+from cores.jobs import run_email_code_purger
+from cores.metrics import MetricsMiddleware, registry
+from cores.rate_limit import rate_limit_stats
+from cores.tokens import token_ledger
+from models import dispose_engines, get_engine, get_read_engine, pool_stats
+from repository.user_cache import user_cache
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 导入时不创建 engine 和模型客户端，在这里建好
+    get_engine()
+    get_read_engine()
+    # LangChain 导入要一两秒，放到线程里预加载，不耽误开始接收请求
+    llm_task = asyncio.create_task(asyncio.to_thread(llm_router.load))
+    # 后台任务：预生成热门组合的名字
+    inventory_task = asyncio.create_task(run_inventory_worker())
+    # 后台发信 worker
+    mail_dispatcher.start()
+    # 定期清理 email_code 表里的过期验证码
+    purge_task = asyncio.create_task(run_email_code_purger())
+    # 起名记录异步落库
+    history_writer.start()
+    yield
+    await history_writer.stop()
+    await mail_dispatcher.stop()
+    inventory_task.cancel()
+    purge_task.cancel()
+    await asyncio.gather(llm_task, return_exceptions=True)
+    await dispose_engines()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 app.include_router(auth_router)
 app.include_router(name_router)
 
+# 各组件已有的 stats()，只在抓取 /metrics 时才调用
+registry.register_collector("name_cache", name_cache.stats)
+registry.register_collector("name_flight", name_flight.stats)
+registry.register_collector("llm_scheduler", llm_scheduler.stats)
+registry.register_collector("llm_router", llm_router.stats)
+registry.register_collector("llm_circuit", name_breaker.stats)
+registry.register_collector("llm_backend", llm_router.backend_stats, label="backend")
+registry.register_collector("name_inventory", name_inventory.stats)
+registry.register_collector("name_filter", filter_stats.stats)
+registry.register_collector("mail", mail_dispatcher.stats)
+registry.register_collector("name_history", history_writer.stats)
+registry.register_collector("user_cache", user_cache.stats)
+registry.register_collector("db_pool", pool_stats, label="pool")
+registry.register_collector("llm_usage", token_ledger.stats, label="endpoint")
+registry.register_collector("rate_limit", rate_limit_stats, label="rule")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 @app.get("/")
 async def root():
@@ -26,8 +85,10 @@ async def say_hello(name: str):
 @app.get("/mail/test")
 async def mail_test(
         email: str,
-        mail: FastMail = Depends(get_mail),
+        mail=Depends(get_mail),
 ):
+    from fastapi_mail import MessageSchema, MessageType
+
     message = MessageSchema(
         subject="hello",
         recipients=[email],
@@ -1,5 +1,8 @@
-from sqlalchemy.ext.asyncio import create_async_engine
-from settings import DB_URI
+import time
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import settings
 # 3.创建会话工厂，在上面__init__.py文件基础上补全下面代码
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -7,28 +10,103 @@ from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy import MetaData
 
 
+class PoolWaitStats:
+    """从连接池拿连接的等待时间，等待变长说明连接池不够用了"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float) -> None:
+        self.checkouts += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """记录每次 checkout 等待时间的连接池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.wait_stats.record(time.perf_counter() - start)
+
+
+def _create_engine(uri: str):
+    return create_async_engine(
+        uri,
+        # 将输出所有执行 SQL 的日志（只在开发环境打开，同步写日志很慢）
+        echo=settings.DB_ECHO,
+        poolclass=TimedQueuePool,
+        # 连接池大小，按 worker 数从总连接预算里分出来（见 settings）
+        pool_size=settings.DB_POOL_SIZE,
+        # 允许连接池最大的连接数
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        # 获取连接超时时间（默认是 30s）
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        # 连接回收时间（默认是 -1，代表永不回收）
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        # 连接前是否预检查（默认为 False）
+        pool_pre_ping=True,
+    )
+
+
+# engine 第一次用到时才创建（创建时要导入数据库驱动），lifespan 启动时会先建好，关闭时释放
+_engines: dict[str, AsyncEngine] = {}
+
+
+def get_engine() -> AsyncEngine:
+    if "primary" not in _engines:
+        _engines["primary"] = _create_engine(settings.DB_URI)
+    return _engines["primary"]
 
-engine = create_async_engine(
-    DB_URI,
-    # 将输出所有执行 SQL 的日志（默认是关闭的）
-    echo=True,
-    # 连接池大小（默认是 5 个）
-    pool_size=10,
-    # 允许连接池最大的连接数（默认是 10 个）
-    max_overflow=20,
-    # 获取连接超时时间（默认是 30s）
-    pool_timeout=10,
-    # 连接回收时间（默认是 -1，代表永不回收）
-    pool_recycle=3600,
-    # 连接前是否预检查（默认为 False）
-    pool_pre_ping=True,
-)
 
+def get_read_engine() -> AsyncEngine:
+    # 只读从库；没配置时就是主库
+    if not settings.DB_REPLICA_URI:
+        return get_engine()
+    if "replica" not in _engines:
+        _engines["replica"] = _create_engine(settings.DB_REPLICA_URI)
+    return _engines["replica"]
 
 
-AsyncSessionFactory = sessionmaker(
-    # Engine 或者其子类对象（这里是 AsyncEngine）
-    bind=engine,
+async def dispose_engines() -> None:
+    # dispose 只是关掉池里的连接，engine 之后还能继续用（会重新建连接）
+    for item in _engines.values():
+        await item.dispose()
+
+
+def __getattr__(name: str):
+    # 兼容 from models import engine / read_engine 的写法
+    if name == "engine":
+        return get_engine()
+    if name == "read_engine":
+        return get_read_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class LazySessionMaker(sessionmaker):
+    """第一次创建会话时才绑定 engine"""
+
+    def __init__(self, get_bind, **kwargs):
+        super().__init__(**kwargs)
+        self._get_bind = get_bind
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=self._get_bind())
+        return super().__call__(**local_kw)
+
+
+AsyncSessionFactory = LazySessionMaker(
+    get_engine,
     # Session 类的代替（默认是 Session 类）
     class_=AsyncSession,
     # 是否在查找之前执行 flush 操作（默认是 True）
@@ -37,6 +115,33 @@ AsyncSessionFactory = sessionmaker(
     expire_on_commit=False
 )
 
+# 只读查询用的会话工厂
+ReadSessionFactory = LazySessionMaker(
+    get_read_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+
+def pool_stats() -> dict:
+    """各个连接池的使用情况：常驻/借出/溢出连接数，以及 checkout 等待时间"""
+    # 只统计已经创建的连接池，抓指标不会触发创建 engine
+    stats = {}
+    for name, item in _engines.items():
+        pool = item.sync_engine.pool
+        waits = pool.wait_stats
+        stats[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "checked_in": pool.checkedin(),
+            "checkouts": waits.checkouts,
+            "wait_avg": waits.wait_total / waits.checkouts if waits.checkouts else 0.0,
+            "wait_max": waits.wait_max,
+        }
+    return stats
+
 
 # 定义命名约定的 Base 类
 class Base(DeclarativeBase):
@@ -55,4 +160,5 @@ class Base(DeclarativeBase):
         }
     )
 
-from . import user
\ No newline at end of file
+from . import user
+from . import name
\ No newline at end of file
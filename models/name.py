@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from . import Base
+from sqlalchemy.orm import mapped_column, Mapped, relationship
+from sqlalchemy import String, Integer, DateTime, Index, ForeignKey, JSON, Text
+
+
+class NameRequest(Base):
+    __tablename__ = "name_request"
+    # 按用户翻历史记录：WHERE user_id = ? AND (created_time, id) < 游标 ORDER BY created_time DESC, id DESC
+    __table_args__ = (
+        Index("ix_name_request_user_id_created_time", "user_id", "created_time", "id"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # 不加外键：历史是后台批量写入的，不希望因为用户表上的锁拖慢写入
+    user_id: Mapped[int] = mapped_column(Integer)
+    surname: Mapped[str] = mapped_column(String(20))
+    gender: Mapped[str] = mapped_column(String(10))
+    length: Mapped[str] = mapped_column(String(10))
+    other: Mapped[str] = mapped_column(String(500), default="")
+    exclude: Mapped[list] = mapped_column(JSON, default=list)
+    created_time: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+    candidates: Mapped[list["NameCandidate"]] = relationship(
+        back_populates="request", order_by="NameCandidate.id", cascade="all, delete-orphan",
+    )
+
+
+class NameCandidate(Base):
+    __tablename__ = "name_candidate"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    request_id: Mapped[int] = mapped_column(
+        ForeignKey("name_request.id", ondelete="CASCADE"), index=True,
+    )
+    name: Mapped[str] = mapped_column(String(20))
+    reference: Mapped[str] = mapped_column(String(500))
+    moral: Mapped[str] = mapped_column(Text)
+
+    request: Mapped[NameRequest] = relationship(back_populates="candidates")
@@ -2,13 +2,8 @@ from datetime import datetime
 
 from . import Base
 from sqlalchemy.orm import mapped_column, Mapped
-from sqlalchemy import String, Integer, DateTime
-from pwdlib import PasswordHash
-
-# 下载密码加密包
-# pip install "pwdlib[argon2]"
-
-password_hash = PasswordHash.recommended()
+from sqlalchemy import String, Integer, DateTime, Index
+from cores.password import password_hash
 
 class User(Base):
     __tablename__ = "user"
@@ -18,7 +13,8 @@ class User(Base):
     _password: Mapped[str] = mapped_column(String(200))
 
     def __init__(self, *args, **kwargs):
-        password = kwargs.pop("password")
+        # 异步代码里请先用 password_service.hash 算好哈希，再通过 _password 传进来
+        password = kwargs.pop("password", None)
         super().__init__(*args, **kwargs)
         if password:
             self.password = password
@@ -38,7 +34,11 @@ class User(Base):
 
 class EmailCode(Base):
     __tablename__ = "email_code"
+    # 按邮箱查最新的验证码、按时间清理过期验证码都走这个索引
+    __table_args__ = (
+        Index("ix_email_code_email_created_time", "email", "created_time"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     email: Mapped[str] = mapped_column(String(100))
     code: Mapped[str] = mapped_column(String(10))
-    created_time: Mapped[datetime] = mapped_column(DateTime, default=datetime.now())
\ No newline at end of file
+    created_time: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
\ No newline at end of file
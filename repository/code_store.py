@@ -0,0 +1,71 @@
+from typing import Protocol
+
+import settings
+from cores.cache import KVStore
+from repository.user_repo import EmailCodeRepository
+
+
+class CodeStore(Protocol):
+    """验证码存储：save 保存（覆盖旧的），verify 校验成功后立即作废"""
+
+    async def save(self, email: str, code: str) -> None: ...
+
+    async def verify(self, email: str, code: str) -> bool: ...
+
+
+class KVCodeStore:
+    """
+    键值存储后端（进程内替身或 Redis）：过期由存储负责，不碰数据库。
+    每个验证码最多尝试 max_attempts 次，超过就作废，防止暴力猜 4 位数字。
+    """
+
+    def __init__(self, kv: KVStore, ttl: int, max_attempts: int):
+        self.kv = kv
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+
+    @staticmethod
+    def _keys(email: str) -> tuple[str, str]:
+        return f"email_code:{email}", f"email_code_attempts:{email}"
+
+    async def save(self, email: str, code: str) -> None:
+        code_key, attempts_key = self._keys(email)
+        await self.kv.set(code_key, code, ex=self.ttl)
+        await self.kv.delete(attempts_key)
+
+    async def verify(self, email: str, code: str) -> bool:
+        code_key, attempts_key = self._keys(email)
+        stored = await self.kv.get(code_key)
+        if stored is None:
+            return False
+        attempts = await self.kv.incr(attempts_key)
+        if attempts == 1:
+            await self.kv.expire(attempts_key, self.ttl)
+        if attempts > self.max_attempts:
+            await self.kv.delete(code_key)
+            return False
+        if isinstance(stored, bytes):
+            stored = stored.decode()
+        if stored != code:
+            return False
+        # delete 返回 1 才算自己用掉了这个验证码，并发提交时只有一个能成功
+        if await self.kv.delete(code_key) != 1:
+            return False
+        await self.kv.delete(attempts_key)
+        return True
+
+
+class SqlCodeStore:
+    """原来的 MySQL 后端，保留作为可选项"""
+
+    def __init__(self, repo: EmailCodeRepository):
+        self.repo = repo
+
+    async def save(self, email: str, code: str) -> None:
+        await self.repo.create_email_code(email, code)
+
+    async def verify(self, email: str, code: str) -> bool:
+        if not await self.repo.check_email_code(email, code):
+            return False
+        await self.repo.delete_email_codes(email)
+        return True
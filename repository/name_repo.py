@@ -0,0 +1,70 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import select, or_, and_
+from sqlalchemy.orm import selectinload
+
+from models import AsyncSession
+from models.name import NameRequest
+
+from cores.metrics import timed
+
+
+class CursorError(Exception):
+    """分页游标格式不对"""
+
+
+def encode_cursor(request: NameRequest) -> str:
+    # 游标就是上一页最后一条的 (created_time, id)，对客户端不透明
+    raw = f"{request.created_time.isoformat()}|{request.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_time, request_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_time), int(request_id)
+    except ValueError:
+        raise CursorError()
+
+
+class NameRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @timed("db.name.add_requests")
+    async def add_requests(self, requests: list[NameRequest]) -> None:
+        """一批起名记录（连同候选名字）在一个事务里写入"""
+        async with self.session.begin():
+            self.session.add_all(requests)
+
+    @timed("db.name.list_history")
+    async def list_history(
+            self, user_id: int, limit: int, cursor: str | None = None
+    ) -> tuple[list[NameRequest], str | None]:
+        """
+        按时间倒序翻某个用户的起名记录，返回 (这一页, 下一页的游标)。
+        keyset 分页：从游标位置沿 (user_id, created_time, id) 索引往后扫 limit 条，
+        不用 OFFSET，翻到多深都只读一页的数据
+        """
+        stmt = (
+            select(NameRequest)
+            .where(NameRequest.user_id == user_id)
+            .options(selectinload(NameRequest.candidates))
+            .order_by(NameRequest.created_time.desc(), NameRequest.id.desc())
+            # 多取一条，用来判断还有没有下一页
+            .limit(limit + 1)
+        )
+        if cursor is not None:
+            created_time, request_id = decode_cursor(cursor)
+            stmt = stmt.where(or_(
+                NameRequest.created_time < created_time,
+                and_(NameRequest.created_time == created_time, NameRequest.id < request_id),
+            ))
+        async with self.session.begin():
+            requests = list((await self.session.scalars(stmt)).all())
+        if len(requests) <= limit:
+            return requests, None
+        requests = requests[:limit]
+        return requests, encode_cursor(requests[-1])
@@ -0,0 +1,76 @@
+import settings
+from cores.cache import LRUCache
+from models.user import User
+
+# 负缓存的占位值：这个邮箱确定没有注册
+NOT_FOUND = object()
+
+
+class UserCache:
+    """
+    用户读缓存：按邮箱和按 id 各一份 LRU。
+    - 不存在的邮箱也缓存一小段时间（负缓存），撞库请求不用每次都查 MySQL
+    - 创建用户/改密码时由 UserRepository 写穿透更新或删除
+    缓存里是已经脱离会话的 User 对象，只能读，不要修改或 add 回会话。
+    """
+
+    def __init__(self, maxsize: int, ttl: int, negative_ttl: int):
+        self.negative_ttl = negative_ttl
+        self._by_email = LRUCache(maxsize, ttl)
+        self._by_id = LRUCache(maxsize, ttl)
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def _get(self, cache: LRUCache, key):
+        value = cache.get(key)
+        if value is None:
+            self.misses += 1
+        elif value is NOT_FOUND:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get_by_email(self, email: str):
+        """返回 User、NOT_FOUND（确定不存在）或 None（没缓存）"""
+        return self._get(self._by_email, email)
+
+    def get_by_id(self, user_id: int):
+        return self._get(self._by_id, user_id)
+
+    def put(self, user: User) -> None:
+        self._by_email.set(user.email, user)
+        self._by_id.set(user.id, user)
+
+    def put_missing_email(self, email: str) -> None:
+        self._by_email.set(email, NOT_FOUND, ttl=self.negative_ttl)
+
+    def put_missing_id(self, user_id: int) -> None:
+        self._by_id.set(user_id, NOT_FOUND, ttl=self.negative_ttl)
+
+    def invalidate(self, user_id: int | None = None, email: str | None = None) -> None:
+        if user_id is not None:
+            user = self._by_id.get(user_id)
+            if isinstance(user, User):
+                self._by_email.delete(user.email)
+            self._by_id.delete(user_id)
+        if email is not None:
+            self._by_email.delete(email)
+
+    def stats(self) -> dict:
+        total = self.hits + self.negative_hits + self.misses
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.negative_hits) / total if total else 0.0,
+            "size": len(self._by_email),
+        }
+
+
+user_cache = UserCache(
+    maxsize=settings.USER_CACHE_SIZE,
+    ttl=settings.USER_CACHE_TTL,
+    negative_ttl=settings.USER_CACHE_NEGATIVE_TTL,
+)
@@ -1,33 +1,128 @@
 from pydantic import BaseModel
-from sqlalchemy import select, exists
+from sqlalchemy import select, exists, update, delete
+from sqlalchemy.exc import IntegrityError
 
 from models import AsyncSession
 from models.user import EmailCode, User
 
 from datetime import datetime, timedelta
 
+import settings
 from schemas.user import UserCreateSchema
+from cores.metrics import timed
+from cores.password import password_service
+from repository.user_cache import NOT_FOUND, user_cache
+
+
+class EmailExistsError(Exception):
+    """邮箱已经注册过（uq_user_email 唯一约束冲突）"""
+
+
+class EmailCodeError(Exception):
+    """验证码不存在、不匹配或已过期"""
+
+
+def _latest_code_stmt(email: str):
+    # 这个邮箱最新的一条未过期验证码，走 (email, created_time) 索引
+    return (
+        select(EmailCode.code)
+        .where(
+            EmailCode.email == email,
+            EmailCode.created_time >= datetime.now() - timedelta(seconds=settings.EMAIL_CODE_TTL),
+        )
+        .order_by(EmailCode.created_time.desc())
+        .limit(1)
+    )
 
 
 class UserRepository:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, read_session: AsyncSession | None = None):
         self.session = session
+        # 只读查询用的会话，可以指向从库；不传就用主库
+        self.read_session = read_session or session
 
+    @timed("db.user.get_by_email")
     async def get_by_email(self, email: str) -> User | None:
-        async with self.session.begin():
-            user = await self.session.scalar(select(User).where(User.email == email))
-            return user
-
+        cached = user_cache.get_by_email(email)
+        if cached is not None:
+            return None if cached is NOT_FOUND else cached
+        async with self.read_session.begin():
+            user = await self.read_session.scalar(select(User).where(User.email == email))
+        if user is None:
+            user_cache.put_missing_email(email)
+        else:
+            user_cache.put(user)
+        return user
+
+    @timed("db.user.get_by_id")
+    async def get_by_id(self, user_id: int) -> User | None:
+        cached = user_cache.get_by_id(user_id)
+        if cached is not None:
+            return None if cached is NOT_FOUND else cached
+        async with self.read_session.begin():
+            user = await self.read_session.get(User, user_id)
+        if user is None:
+            user_cache.put_missing_id(user_id)
+        else:
+            user_cache.put(user)
+        return user
+
+    @timed("db.user.email_exist")
     async def email_exist(self, email: str) -> bool:
-        async with self.session.begin():
+        async with self.read_session.begin():
             stmt = select(exists().where(User.email == email))
-            return await self.session.scalar(stmt)
+            return await self.read_session.scalar(stmt)
 
+    @timed("db.user.create_user")
     async def create_user(self, user_schema: UserCreateSchema) -> User:
+        data = user_schema.model_dump()
+        # 哈希在线程池里算，不占着事务也不阻塞事件循环
+        hashed = await password_service.hash(data.pop("password"))
         async with self.session.begin():
-            user = User(**user_schema.model_dump())
+            user = User(**data, _password=hashed)
             self.session.add(user)
-            return user
+        # 写穿透：顺便把之前的负缓存覆盖掉
+        user_cache.put(user)
+        return user
+
+    @timed("db.user.register_user")
+    async def register_user(self, user_schema: UserCreateSchema, code: str | None = None) -> User:
+        """
+        注册：一个事务完成。
+        - code 不为 None 时，在同一个事务里校验并作废 email_code 表里的验证码
+        - 不预先查邮箱是否存在，直接插入，靠 uq_user_email 唯一约束兜底，没有竞态
+        - 先用一次便宜的查询校验验证码，对了才算 Argon2 哈希，验证码错误的请求不消耗 CPU；
+          事务里还会再校验一次（哈希期间验证码可能已经被用掉）
+        """
+        data = user_schema.model_dump()
+        if code is not None:
+            async with self.session.begin():
+                latest = await self.session.scalar(_latest_code_stmt(data["email"]))
+            if latest is None or latest != code:
+                raise EmailCodeError()
+        hashed = await password_service.hash(data.pop("password"))
+        try:
+            async with self.session.begin():
+                if code is not None:
+                    latest = await self.session.scalar(_latest_code_stmt(data["email"]))
+                    if latest is None or latest != code:
+                        raise EmailCodeError()
+                    await self.session.execute(delete(EmailCode).where(EmailCode.email == data["email"]))
+                user = User(**data, _password=hashed)
+                self.session.add(user)
+                await self.session.flush()
+        except IntegrityError:
+            raise EmailExistsError()
+        user_cache.put(user)
+        return user
+
+    @timed("db.user.update_password_hash")
+    async def update_password_hash(self, user_id: int, hashed: str) -> None:
+        async with self.session.begin():
+            await self.session.execute(
+                update(User).where(User.id == user_id).values({User._password: hashed})
+            )
+        user_cache.invalidate(user_id=user_id)
 
 
 
@@ -35,21 +130,34 @@ class EmailCodeRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
+    @timed("db.email_code.create_email_code")
     async def create_email_code(self, email: str, code: str) -> EmailCode:
         async with self.session.begin():
             email_code = EmailCode(email=email, code=code)
             self.session.add(email_code)
             return email_code
 
+    @timed("db.email_code.check_email_code")
     async def check_email_code(self, email:str, code:str) -> bool:
         async with self.session.begin():
-            stmt = select(EmailCode).where(EmailCode.email == email, EmailCode.code == code)
-            email_code:EmailCode | None = await self.session.scalar(stmt)
-            if email_code is None:
-                return False
-            if (datetime.now() - email_code.created_time) > timedelta(minutes=10):
-                return False
-            return True
-
-
+            latest: str | None = await self.session.scalar(_latest_code_stmt(email))
+            return latest is not None and latest == code
 
+    @timed("db.email_code.delete_email_codes")
+    async def delete_email_codes(self, email: str) -> None:
+        async with self.session.begin():
+            await self.session.execute(delete(EmailCode).where(EmailCode.email == email))
+
+    @timed("db.email_code.purge_expired")
+    async def purge_expired(self, batch_size: int) -> int:
+        """
+        删除一批过期验证码，返回删除的条数。
+        先按索引查出一小批 id 再按主键删，每批一个短事务，不会长时间锁表
+        """
+        cutoff = datetime.now() - timedelta(seconds=settings.EMAIL_CODE_TTL)
+        async with self.session.begin():
+            stmt = select(EmailCode.id).where(EmailCode.created_time < cutoff).limit(batch_size)
+            ids = (await self.session.scalars(stmt)).all()
+            if ids:
+                await self.session.execute(delete(EmailCode).where(EmailCode.id.in_(ids)))
+            return len(ids)
@@ -3,18 +3,24 @@ import string
 from typing import Annotated
 
 import jwt
-from aiosmtplib import SMTPResponseException
 from fastapi import APIRouter, HTTPException, Query
 from fastapi.params import Depends
-from fastapi_mail import FastMail, MessageSchema, MessageType
 from pydantic import EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession, session
 
-from dependencies import get_mail, get_session
-from repository.user_repo import EmailCodeRepository, UserRepository
+import settings
+from dependencies import get_session, get_read_session, get_code_store
+from repository.code_store import CodeStore
+from repository.user_repo import UserRepository, EmailExistsError, EmailCodeError
 from schemas import ResponseOut
 from schemas.user import UserRegisterIn, UserCreateSchema, UserLoginIn, UserLogOut, UserSchema
 from cores.auth import AuthHandler
+from cores.password import password_service
+from cores.mail_queue import mail_dispatcher
+from cores.responses import respond
+from cores.rate_limit import (
+    by_email, by_ip, code_email_limiter, code_ip_limiter, login_email_limiter, login_ip_limiter,
+)
 
 # 创建对戏那个（实例）
 auth_handler = AuthHandler()
@@ -22,82 +28,86 @@ auth_handler = AuthHandler()
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
-@router.get("/code", response_model=ResponseOut)
+# 限流挂在路由的 dependencies 上，比 get_session / get_code_store 先执行，超限的请求不会碰数据库和 SMTP
+@router.get("/code", response_model=ResponseOut, dependencies=[
+    Depends(by_ip(code_ip_limiter)),
+    Depends(by_email(code_email_limiter)),
+])
 async def get_code(
     email: Annotated[EmailStr, Query(...)],
-    mail: FastMail = Depends(get_mail),
-    session: AsyncSession = Depends(get_session)
+    code_store: CodeStore = Depends(get_code_store)
 ):
     code = "".join(random.choices(string.digits, k=4))
 
-    message = MessageSchema(
+    await code_store.save(str(email), code)
+    # 只放进发信队列，不等 SMTP，后台 worker 用长连接发送
+    mail_dispatcher.enqueue(
+        recipient=str(email),
         subject="【AI起名】验证码",
-        recipients=[str(email)],
         body=f"验证码是：{code}",
-        subtype=MessageType.plain
     )
-
-    repo = EmailCodeRepository(session)
-
-    try:
-        await mail.send_message(message)
-    except SMTPResponseException as e:
-        msg = str(e)
-        # QQ 典型：QUIT/关闭阶段返回畸形响应行（含 \x00），但邮件已成功发送
-        if e.code == -1 and ("Malformed SMTP response line" in msg or "\\x00" in msg):
-            pass
-        else:
-            raise HTTPException(status_code=500, detail=f"邮件发送失败：{e}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"邮件发送失败：{e}")
-
-    await repo.create_email_code(str(email), code)
-    return ResponseOut()
+    return respond(ResponseOut())
 
 @router.post("/register", response_model=ResponseOut)
 async def register(
         data: UserRegisterIn,
-        session: AsyncSession = Depends(get_session)
+        session: AsyncSession = Depends(get_session),
+        code_store: CodeStore = Depends(get_code_store)
 ):
-    user_repo = UserRepository(session)
-    email_exist = await user_repo.email_exist(str(data.email))
-    if email_exist:
-        raise HTTPException(400, "邮箱已存在")
+    # sql 后端的验证码和插入用户放在同一个事务里校验；kv 后端先在 kv 里校验
+    sql_code = settings.CODE_STORE_BACKEND == "sql"
+    if not sql_code:
+        code_match = await code_store.verify(str(data.email), str(data.code))
+        if not code_match:
+            raise HTTPException(400, "邮箱或验证码错误")
 
-    code_repo = EmailCodeRepository(session)
-    code_repo_match = await code_repo.check_email_code(str(data.email), str(data.code))
-    if not code_repo_match:
-        raise HTTPException(400, "邮箱或验证码错误")
+    user_repo = UserRepository(session)
     try:
-        await user_repo.create_user(UserCreateSchema(
-            email = data.email,
-            username = data.username,
-            password = data.password,
-        ))
+        await user_repo.register_user(
+            UserCreateSchema(
+                email = data.email,
+                username = data.username,
+                password = data.password,
+            ),
+            code=str(data.code) if sql_code else None,
+        )
+    except EmailCodeError:
+        raise HTTPException(400, "邮箱或验证码错误")
+    except EmailExistsError:
+        raise HTTPException(400, "邮箱已存在")
     except Exception as e:
         raise HTTPException(500, str(e))
-    return ResponseOut()
+    return respond(ResponseOut())
 
-@router.post("/login", response_model=UserLogOut)
+# 按邮箱限流防止对单个账号暴力猜密码，按 IP 限流防止换着邮箱刷 Argon2
+@router.post("/login", response_model=UserLogOut, dependencies=[
+    Depends(by_ip(login_ip_limiter)),
+    Depends(by_email(login_email_limiter, source="body")),
+])
 async def login(
     data: UserLoginIn,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_session),
+    read_session: AsyncSession = Depends(get_read_session)
 ):
-    # 操作数据库，查一下用户是否存在
-    user_repo = UserRepository(session)
+    # 查用户走从库；刚注册的用户已经写穿透进了用户缓存，不怕从库延迟
+    user_repo = UserRepository(session, read_session)
     user = await user_repo.get_by_email(str(data.email))
     if not user:
         raise HTTPException(400, "用户不存在")
-    check = user.check_password(data.password)
+    check, new_hash = await password_service.verify_and_update(data.password, user.password)
     if not check:
         raise HTTPException(400,"密码或邮箱错误")
+    # 哈希参数变了，顺便把新哈希存回去
+    if new_hash:
+        await user_repo.update_password_hash(user.id, new_hash)
 
     # 校验通过生成jwt
     token = auth_handler.encode_login_token(user_id=user.id)
-    return {
-        "user": user,
-        "token": token["access_token"]
-    }
+    # 直接从 ORM 对象构造，不用再把 email 按 EmailStr 校验一遍
+    return respond(UserLogOut.model_construct(
+        user=UserSchema.model_construct(id=user.id, email=user.email, username=user.username),
+        token=token["access_token"],
+    ))
 
 
 
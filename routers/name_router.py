@@ -1,8 +1,24 @@
-from fastapi import APIRouter
+import asyncio
+import json
+import time
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from fastapi.params import Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from schemas.name import NameIn, NameOut
-from cores.agent import generate_name
+import settings
+from cores.metrics import registry
+from schemas.agent import NameSchema
+from schemas.name import NameIn, NameOut, NameBatchIn, NameBatchOut, NameHistoryItemOut, NameHistoryOut
+from cores.agent import generate_name, stream_names
+from cores.batch import submit_batch, get_batch
+from cores.history import history_writer
+from cores.rate_limit import by_user, name_user_limiter
+from cores.responses import respond
+from cores.tokens import token_ledger
+from dependencies import get_read_session
+from repository.name_repo import CursorError, NameRepository
 
 from cores.auth import AuthHandler
 
@@ -10,11 +26,149 @@ auth_handler = AuthHandler()
 
 router = APIRouter(prefix="/name", tags=["name"])
 
-@router.post("", response_model=NameOut)
+# 起名接口按用户限流（命中缓存的请求也算），调度器的排队上限只管真正调用模型的
+limit_by_user = Depends(by_user(name_user_limiter, auth_handler.auth_wrapper))
+
+
+client_disconnects = registry.counter(
+    "client_disconnects_total", "请求处理完之前客户端就断开的次数", ("endpoint",),
+)
+
+
+async def _until_disconnected(request: Request, coro):
+    """
+    执行 coro，期间定期检查客户端是否已经断开；断开了就取消，不再占着名额等模型。
+    返回 None 表示客户端已经断开。
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.NAME_DISCONNECT_POLL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                client_disconnects.inc(1, request.url.path)
+                return None
+    finally:
+        task.cancel()
+
+
+def _sse(event: str, data: str) -> str:
+    # Server-Sent Events 的一条消息：event 行 + data 行 + 空行
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+@router.post("", response_model=NameOut, dependencies=[limit_by_user])
 async def create_name(
         data:NameIn,
+        request: Request,
+        response: Response,
         user_id: int = Depends(auth_handler.auth_wrapper)
 ):
-    results = await generate_name(data)
+    usage = token_ledger.begin(user_id)
+    results = await _until_disconnected(request, generate_name(data, user_id))
+    if results is None:
+        # 499：nginx 的约定，客户端主动关闭了连接，这个响应不会有人收到
+        return Response(status_code=499)
+    # 这次请求的 token 用量和模型耗时（命中缓存时都是 0）
+    response.headers["X-LLM-Usage"] = usage.header()
+    # 只放进队列，后台批量落库，不占响应时间
+    history_writer.record(user_id, data, results.names)
     # 注意这里的写法，必须显式告诉schema：这个值是给哪个字段的。
-    return NameOut(names=results.names)
\ No newline at end of file
+    # results.names 已经是校验过的 NameSchema，用 model_construct 不再校验一遍
+    return respond(NameOut.model_construct(names=results.names), response)
+
+
+@router.post("/stream", dependencies=[limit_by_user])
+async def create_name_stream(
+        data: NameIn,
+        user_id: int = Depends(auth_handler.auth_wrapper)
+):
+    """
+    SSE 流式起名：每生成一个候选就推送一条 candidate 事件，最后推送 done 汇总
+    """
+    async def event_stream():
+        usage = token_ledger.begin(user_id)
+        start = time.perf_counter()
+        names = []
+        try:
+            async for item in stream_names(data, user_id):
+                names.append(item)
+                yield _sse("candidate", item.model_dump_json())
+        except Exception as e:
+            yield _sse("error", json.dumps({"detail": str(e)}, ensure_ascii=False))
+            return
+        if names:
+            history_writer.record(user_id, data, names)
+        summary = {
+            "count": len(names),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000),
+            "names": [item.model_dump() for item in names],
+            "usage": usage.to_dict(),
+        }
+        yield _sse("done", json.dumps(summary, ensure_ascii=False))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/history", response_model=NameHistoryOut)
+async def get_name_history(
+        limit: int = Query(20, ge=1, le=settings.NAME_HISTORY_PAGE_MAX),
+        cursor: str | None = Query(None, description="上一页返回的 next_cursor"),
+        session: AsyncSession = Depends(get_read_session),
+        user_id: int = Depends(auth_handler.auth_wrapper)
+):
+    """
+    起名历史，按时间倒序分页。记录是异步写入的，刚生成的结果可能要过一小会儿才查得到
+    """
+    try:
+        requests, next_cursor = await NameRepository(session).list_history(user_id, limit, cursor)
+    except CursorError:
+        raise HTTPException(400, "cursor 无效")
+    # 数据库里的记录是写入前校验过的，直接构造
+    items = [
+        NameHistoryItemOut.model_construct(
+            id=request.id,
+            surname=request.surname,
+            gender=request.gender,
+            length=request.length,
+            other=request.other,
+            exclude=request.exclude,
+            names=[
+                NameSchema.model_construct(name=item.name, reference=item.reference, moral=item.moral)
+                for item in request.candidates
+            ],
+            created_time=request.created_time,
+        )
+        for request in requests
+    ]
+    return respond(NameHistoryOut.model_construct(items=items, next_cursor=next_cursor))
+
+
+@router.post("/batch", response_model=NameBatchOut, dependencies=[limit_by_user])
+async def create_name_batch(
+        data: NameBatchIn,
+        user_id: int = Depends(auth_handler.auth_wrapper)
+):
+    """
+    批量起名：相同请求去重，简单请求合并成一次调用。
+    数量较多或 async_mode=true 时立即返回 job_id，用 GET /name/batch/{job_id} 轮询
+    """
+    token_ledger.begin(user_id)
+    job = await submit_batch(data.items, user_id, data.async_mode)
+    return job.to_out()
+
+
+@router.get("/batch/{job_id}", response_model=NameBatchOut)
+async def get_name_batch(
+        job_id: str,
+        user_id: int = Depends(auth_handler.auth_wrapper)
+):
+    job = await get_batch(job_id, user_id)
+    if job is None:
+        raise HTTPException(404, "任务不存在或已过期")
+    return job
@@ -11,3 +11,13 @@ class NameSchema(BaseModel):
 
 class NameResultSchema(BaseModel):
     names: List[NameSchema]
+
+
+class NameGroupSchema(BaseModel):
+    index: Annotated[int, Field(..., description="编号")]
+    names: List[NameSchema]
+
+
+class NameBatchResultSchema(BaseModel):
+    # 一次给多个人起名时，按编号分组返回
+    groups: List[NameGroupSchema]
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel, Field
 from typing import Annotated, Literal, List
 from .agent import NameSchema
@@ -25,3 +27,47 @@ class NameIn(BaseModel):
 
 class NameOut(BaseModel):
     names: List[NameSchema]
+
+
+class NameBatchIn(BaseModel):
+    items: Annotated[
+        List[NameIn],
+        Field(..., min_length=1, max_length=1000, description="起名请求列表")
+    ]
+    async_mode: Annotated[
+        bool,
+        Field(False, description="异步模式：立即返回任务 id，之后轮询结果")
+    ]
+
+
+class NameBatchItemOut(BaseModel):
+    index: int
+    names: List[NameSchema] | None = None
+    error: str | None = None
+
+
+class NameBatchOut(BaseModel):
+    job_id: str
+    status: Literal["running", "done"]
+    total: int
+    finished: int
+    items: List[NameBatchItemOut]
+
+
+class NameHistoryItemOut(BaseModel):
+    id: int
+    surname: str
+    gender: str
+    length: str
+    other: str
+    exclude: List[str]
+    names: List[NameSchema]
+    created_time: datetime
+
+
+class NameHistoryOut(BaseModel):
+    items: List[NameHistoryItemOut]
+    next_cursor: Annotated[
+        str | None,
+        Field(None, description="下一页的游标，为空表示没有更多了")
+    ]
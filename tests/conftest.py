@@ -0,0 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
+# 和压测一样用 test 配置（memory:// 等），不读本地的 .env
+os.environ.setdefault("APP_ENV", "test")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
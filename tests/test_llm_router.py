@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from cores.llm_router import Backend, LLMRouter
+
+
+def _router(*backends: Backend, **kwargs) -> LLMRouter:
+    options = {"timeout": 5, "hedge_default_delay": 0.05, "hedge_min_delay": 0.01, "max_hedge_ratio": 1.0}
+    options.update(kwargs)
+    return LLMRouter(list(backends), **options)
+
+
+def _pair() -> tuple[Backend, Backend]:
+    primary, secondary = Backend("a", None), Backend("b", None)
+    # 没有数据的后端分数为 0，排在有数据的前面，这样 a 一定是主请求
+    secondary.record_success(1.0)
+    return primary, secondary
+
+
+class Script:
+    """按后端名字决定每次调用的表现：(延迟秒数, 返回值或异常)"""
+
+    def __init__(self, **plans):
+        self.plans = {name: list(plan) for name, plan in plans.items()}
+        self.started: list[str] = []
+        self.cancelled: list[str] = []
+
+    async def __call__(self, backend: Backend):
+        self.started.append(backend.name)
+        delay, outcome = self.plans[backend.name].pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(backend.name)
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def test_falls_back_to_next_backend_on_error():
+    primary, secondary = _pair()
+    router = _router(primary, secondary)
+    script = Script(a=[(0, RuntimeError("boom"))], b=[(0, "from b")])
+
+    assert asyncio.run(router.invoke(script)) == "from b"
+    assert script.started == ["a", "b"]
+    assert router.stats()["fallbacks"] == 1
+    assert router.stats()["hedges"] == 0
+    assert primary.errors == 1
+
+
+def test_single_backend_is_retried_once():
+    only = Backend("a", None)
+    router = _router(only)
+    script = Script(a=[(0, RuntimeError("boom")), (0, "second try")])
+
+    assert asyncio.run(router.invoke(script)) == "second try"
+    assert script.started == ["a", "a"]
+
+
+def test_raises_last_error_when_every_backend_fails():
+    primary, secondary = _pair()
+    router = _router(primary, secondary)
+    script = Script(a=[(0, RuntimeError("a failed"))], b=[(0, ValueError("b failed"))])
+
+    with pytest.raises(ValueError, match="b failed"):
+        asyncio.run(router.invoke(script))
+    assert router.stats()["failures"] == 1
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    primary, secondary = _pair()
+    router = _router(primary, secondary)
+    # a 超过对冲延迟（没有 p95 数据时用 hedge_default_delay）还没返回，b 很快
+    script = Script(a=[(5, "from a")], b=[(0, "from b")])
+
+    assert asyncio.run(router.invoke(script)) == "from b"
+    assert script.started == ["a", "b"]
+    assert script.cancelled == ["a"]
+    stats = router.stats()
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+    # 输掉被取消的不算后端出错
+    assert primary.errors == 0
+
+
+def test_primary_wins_when_it_finishes_after_hedge():
+    primary, secondary = _pair()
+    router = _router(primary, secondary)
+    script = Script(a=[(0.1, "from a")], b=[(5, "from b")])
+
+    assert asyncio.run(router.invoke(script)) == "from a"
+    assert script.cancelled == ["b"]
+    assert router.stats()["hedges"] == 1
+    assert router.stats()["hedge_wins"] == 0
+
+
+def test_hedge_budget_is_respected():
+    primary, secondary = _pair()
+    router = _router(primary, secondary, max_hedge_ratio=0)
+    script = Script(a=[(0.1, "from a")], b=[])
+
+    assert asyncio.run(router.invoke(script)) == "from a"
+    assert script.started == ["a"]
+    assert router.stats()["hedges"] == 0
+
+
+def test_hedge_delay_uses_latency_quantile():
+    backend = Backend("a", None)
+    router = _router(backend, hedge_quantile=0.95, hedge_min_delay=0.01, hedge_default_delay=10)
+    assert router.hedge_delay(backend) == 10
+    for i in range(100):
+        backend.record_success(0.1 if i < 90 else 0.5)
+    assert router.hedge_delay(backend) == 0.5
+    # 不低于 hedge_min_delay
+    assert _router(backend, hedge_min_delay=1.0).hedge_delay(backend) == 1.0
+
+
+def test_lazy_backends_are_loaded_once():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [Backend("a", None)]
+
+    router = LLMRouter(loader)
+    assert not router.loaded
+    assert router.backend_stats() == {}
+    assert [backend.name for backend in router.backends] == ["a"]
+    router.load()
+    assert calls == [1]
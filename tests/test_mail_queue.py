@@ -0,0 +1,125 @@
+import asyncio
+import socket
+import time
+
+from benchmarks.harness import SMTPSink
+from cores.mail_queue import MailDispatcher
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _dispatcher(port: int, **kwargs) -> MailDispatcher:
+    options = {
+        "hostname": "127.0.0.1", "port": port, "username": None, "password": None,
+        "sender": "bench@example.com", "start_tls": False, "workers": 2,
+        "max_retries": 2, "retry_backoff": 0.05,
+    }
+    options.update(kwargs)
+    return MailDispatcher(**options)
+
+
+def test_delivers_over_reused_connections():
+    port = _free_port()
+
+    async def main():
+        dispatcher = _dispatcher(port, workers=2)
+        dispatcher.start()
+        for i in range(10):
+            dispatcher.enqueue(f"user{i}@example.com", "验证码", "123456")
+        await dispatcher.stop()
+        return dispatcher.stats()
+
+    with SMTPSink(port) as sink:
+        stats = asyncio.run(main())
+    assert sink.received == 10
+    assert sorted(sink.recipients) == sorted(f"user{i}@example.com" for i in range(10))
+    assert stats["sent"] == 10
+    assert stats["failed"] == 0
+    # 每个 worker 一个长连接，不是每封信一个
+    assert stats["connections"] <= 2
+
+
+def test_stop_drains_the_queue():
+    port = _free_port()
+
+    async def main():
+        dispatcher = _dispatcher(port, workers=1, batch_size=3)
+        # 先入队再启动，stop 要等队列里的都发完
+        for i in range(7):
+            dispatcher.enqueue(f"user{i}@example.com", "验证码", "123456")
+        dispatcher.start()
+        await dispatcher.stop()
+        return dispatcher.stats()
+
+    with SMTPSink(port) as sink:
+        stats = asyncio.run(main())
+    assert sink.received == 7
+    assert stats["queue_depth"] == 0
+    assert stats["sent"] == 7
+
+
+def test_gives_up_after_retries_with_backoff():
+    # 这个端口上没有 SMTP 服务
+    port = _free_port()
+
+    async def main():
+        dispatcher = _dispatcher(port, workers=1, max_retries=2, retry_backoff=0.05)
+        dispatcher.start()
+        dispatcher.enqueue("user@example.com", "验证码", "123456")
+        start = time.monotonic()
+        await dispatcher.stop()
+        return dispatcher.stats(), time.monotonic() - start
+
+    stats, elapsed = asyncio.run(main())
+    assert stats["failed"] == 1
+    assert stats["retried"] == 2
+    assert stats["sent"] == 0
+    # 两次退避：0.05 + 0.1
+    assert elapsed >= 0.15
+
+
+def test_retry_succeeds_once_server_is_back():
+    port = _free_port()
+
+    async def main():
+        dispatcher = _dispatcher(port, workers=1, max_retries=3, retry_backoff=0.2)
+        dispatcher.start()
+        dispatcher.enqueue("user@example.com", "验证码", "123456")
+        await asyncio.sleep(0.05)
+        # 第一次发送失败后，在退避期间把收信端起来
+        with SMTPSink(port) as sink:
+            await dispatcher.stop()
+        return dispatcher.stats(), sink
+
+    stats, sink = asyncio.run(main())
+    assert sink.received == 1
+    assert stats["sent"] == 1
+    assert stats["retried"] >= 1
+    assert stats["failed"] == 0
+
+
+def test_reconnects_after_connection_is_dropped():
+    port = _free_port()
+
+    async def main():
+        dispatcher = _dispatcher(port, workers=1)
+        dispatcher.start()
+        with SMTPSink(port) as first:
+            dispatcher.enqueue("a@example.com", "验证码", "123456")
+            await dispatcher._queue.join()
+        # 服务端重启，worker 手里的长连接已经断了
+        with SMTPSink(port) as second:
+            dispatcher.enqueue("b@example.com", "验证码", "123456")
+            await dispatcher.stop()
+        return dispatcher.stats(), first, second
+
+    stats, first, second = asyncio.run(main())
+    assert first.recipients == ["a@example.com"]
+    assert second.recipients == ["b@example.com"]
+    assert stats["sent"] == 2
+    assert stats["failed"] == 0
+    assert stats["connections"] == 2
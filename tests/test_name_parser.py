@@ -0,0 +1,123 @@
+import json
+
+from cores.name_parser import (
+    NameStreamParser,
+    loads_tolerant,
+    parse_batch_result,
+    parse_name_result,
+    repair_json,
+)
+
+
+def _item(name: str, reference: str = "《诗经》", moral: str = "寓意美好") -> dict:
+    return {"name": name, "reference": reference, "moral": moral}
+
+
+def _names(result) -> list[str]:
+    """解析结果（或者流式解析器一次返回的候选列表）里的名字"""
+    items = result if isinstance(result, list) else result.names
+    return [item.name for item in items]
+
+
+PAYLOAD = json.dumps({"names": [_item("张子文"), _item("张浩然")]}, ensure_ascii=False)
+
+
+def test_valid_json_is_parsed_as_is():
+    assert _names(parse_name_result(PAYLOAD)) == ["张子文", "张浩然"]
+    # 顶层直接是数组也行
+    assert _names(parse_name_result(json.dumps([_item("张一鸣")], ensure_ascii=False))) == ["张一鸣"]
+
+
+def test_code_fence_and_prose_are_stripped():
+    text = f"好的，下面是为您起的名字：\n```json\n{PAYLOAD}\n```\n希望您喜欢！"
+    assert repair_json(text) == [PAYLOAD]
+    assert _names(parse_name_result(text)) == ["张子文", "张浩然"]
+
+
+def test_trailing_commas_are_removed():
+    text = '{"names": [{"name": "张子文", "reference": "《诗经》", "moral": "寓意美好",}, ],}'
+    assert loads_tolerant(text) == {"names": [_item("张子文")]}
+
+
+def test_truncated_string_and_brackets_are_closed():
+    text = '{"names": [{"name": "张子文", "reference": "《诗经》", "moral": "寓意美'
+    assert loads_tolerant(text) == {"names": [_item("张子文", moral="寓意美")]}
+
+
+def test_truncated_key_falls_back_to_last_complete_object():
+    text = '{"names": [{"name": "张子文", "reference": "《诗经》", "moral": "寓意美好"}, {"name": "张浩然", "refer'
+    assert _names(parse_name_result(text)) == ["张子文"]
+
+
+def test_truncated_after_escape_keeps_valid_string():
+    text = '{"names": [{"name": "张子文", "reference": "《诗经》", "moral": "美好\\'
+    assert loads_tolerant(text) == {"names": [_item("张子文", moral="美好")]}
+
+
+def test_chinese_key_aliases():
+    text = '{"names": [{"姓名": "张子文", "出处": "《诗经》", "寓意": "寓意美好"}]}'
+    assert parse_name_result(text).names[0].model_dump() == _item("张子文")
+
+
+def test_braces_inside_strings_are_not_structure():
+    item = _item("张子文", reference="《论语》{学而}", moral="好学]不倦}")
+    text = json.dumps({"names": [item]}, ensure_ascii=False)
+    # 截断后再修补，字符串里的括号不能被当成结构
+    truncated = text[:-3]
+    assert loads_tolerant(truncated) == {"names": [item]}
+    assert parse_name_result("```json\n" + text + "\n```").names[0].model_dump() == item
+
+
+def test_candidates_with_missing_fields_are_skipped():
+    text = json.dumps({"names": [{"name": "张子文"}, _item("张浩然")]}, ensure_ascii=False)
+    assert _names(parse_name_result(text)) == ["张浩然"]
+
+
+def test_stream_parser_salvages_complete_objects():
+    # 第二个候选不是合法 JSON，修补也救不回来，只能把完整的第一个捞出来
+    text = '{"names": [{"name": "张子文", "reference": "《诗经》", "moral": "寓意美好"}, {"name": 张浩然}]}'
+    assert loads_tolerant(text) is None
+    assert _names(parse_name_result(text)) == ["张子文"]
+
+
+def test_unparseable_text_returns_none():
+    assert repair_json("抱歉，我无法完成这个请求") == []
+    assert parse_name_result("抱歉，我无法完成这个请求") is None
+
+
+def test_stream_parser_emits_each_candidate_once_it_closes():
+    parser = NameStreamParser()
+    emitted = []
+    for i in range(0, len(PAYLOAD), 3):
+        emitted.append(_names(parser.feed(PAYLOAD[i:i + 3])))
+    # 一段一段喂进去，每个候选只在它闭合的那一段里出现一次
+    flat = [name for chunk in emitted for name in chunk]
+    assert flat == ["张子文", "张浩然"]
+    assert sum(1 for chunk in emitted if chunk) == 2
+
+
+def test_batch_result_groups():
+    text = "```json\n" + json.dumps({"groups": [
+        {"index": 0, "names": [_item("张子文")]},
+        {"index": "1", "names": [_item("王浩然")]},
+        {"index": "x", "names": [_item("李思远")]},
+        {"names": [_item("赵一鸣")]},
+    ]}, ensure_ascii=False) + "\n```"
+    result = parse_batch_result(text)
+    # 编号缺失或不是数字的组跳过，字符串编号转成数字
+    assert [(group.index, _names(group)) for group in result.groups] == [(0, ["张子文"]), (1, ["王浩然"])]
+
+
+def test_batch_result_truncated():
+    text = json.dumps({"groups": [
+        {"index": 0, "names": [_item("张子文")]},
+        {"index": 1, "names": [_item("王浩然")]},
+    ]}, ensure_ascii=False)
+    result = parse_batch_result(text[:text.rindex("王浩然") + 2])
+    # 截断在第二组的候选中间：这个候选字段不全被跳过，组还在但没有名字，由调用方单独补
+    assert [(group.index, _names(group)) for group in result.groups] == [(0, ["张子文"]), (1, [])]
+
+
+def test_batch_result_without_groups():
+    assert parse_batch_result('{"names": []}') is None
+    assert parse_batch_result("没有结果") is None
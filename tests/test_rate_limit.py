@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+import settings
+from cores import rate_limit
+from cores.cache import MemoryKVStore
+from cores.rate_limit import RateLimiter, SlidingWindow, _retry_after, by_email, by_ip
+
+
+class FakeClock:
+    """替换 cores.rate_limit 里的 time，测试里手动拨时间"""
+
+    def __init__(self, now: float = 6000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", fake)
+    return fake
+
+
+def test_retry_after_math():
+    # 上个窗口没有请求：当前窗口还没满就放行
+    assert _retry_after(10, 60, 0, 9, 0) == 0
+    # 当前窗口自己满了：等到下一个窗口
+    assert _retry_after(10, 60, 0, 10, 15) == 45
+    # 上个窗口的 20 次在窗口过半时还算 10 次，加上当前 5 次超了；
+    # 等到 48 秒时权重降到 4，4 + 5 + 1 = 10 正好放行
+    assert _retry_after(10, 60, 20, 5, 30) == pytest.approx(18)
+    assert _retry_after(10, 60, 20, 5, 48) == 0
+    assert _retry_after(10, 60, 10, 0, 30) == 0
+
+
+def test_sliding_window_allows_up_to_limit(clock):
+    async def main():
+        window = SlidingWindow(limit=3, window=60, max_keys=100)
+        waits = [await window.hit("k") for _ in range(5)]
+        other = await window.hit("other")
+        return waits, other
+
+    waits, other = asyncio.run(main())
+    assert waits[:3] == [0, 0, 0]
+    assert all(wait > 0 for wait in waits[3:])
+    # 每个 key 分开计数
+    assert other == 0
+
+
+def test_sliding_window_rejections_do_not_extend_the_lock(clock):
+    async def main():
+        window = SlidingWindow(limit=2, window=60, max_keys=100)
+        await window.hit("k")
+        await window.hit("k")
+        first = await window.hit("k")
+        for _ in range(10):
+            await window.hit("k")
+        again = await window.hit("k")
+        return first, again
+
+    first, again = asyncio.run(main())
+    # 被拒绝的请求不计数，等待时间不会越拒越长
+    assert first == again
+
+
+def test_sliding_window_weights_previous_window(clock):
+    async def main():
+        window = SlidingWindow(limit=4, window=60, max_keys=100)
+        for _ in range(4):
+            assert await window.hit("k") == 0
+        # 下一个窗口刚开始：上个窗口的 4 次全算，要等权重降到 3（过了四分之一个窗口）
+        clock.now += 60
+        blocked = await window.hit("k")
+        # 过了半个窗口，上个窗口只算 2 次，可以再放 2 次
+        clock.now += 30
+        allowed = [await window.hit("k") for _ in range(3)]
+        # 隔了两个窗口，全部清零
+        clock.now += 120
+        reset = [await window.hit("k") for _ in range(4)]
+        return blocked, allowed, reset
+
+    blocked, allowed, reset = asyncio.run(main())
+    assert blocked == pytest.approx(15)
+    assert allowed[:2] == [0, 0]
+    assert allowed[2] > 0
+    assert reset == [0, 0, 0, 0]
+
+
+def test_kv_window_shares_counts_through_the_store(clock):
+    async def main():
+        store = MemoryKVStore()
+        # 两个 limiter 用同一个存储和前缀，相当于两个 worker
+        first = RateLimiter("shared", 3, 60, backend=store)
+        second = RateLimiter("shared", 3, 60, backend=store)
+        await first.hit("k")
+        await second.hit("k")
+        await first.hit("k")
+        with pytest.raises(HTTPException) as error:
+            await second.hit("k")
+        return error.value, first.stats(), second.stats()
+
+    error, first, second = asyncio.run(main())
+    assert error.status_code == 429
+    assert first["allowed"] == 2
+    assert second == {"keys": 0, "allowed": 1, "rejected": 1}
+
+
+def test_limiter_raises_429_with_retry_after(clock):
+    async def main():
+        limiter = RateLimiter("test", 1, 60)
+        clock.now = 6000.0 + 20
+        await limiter.hit("k")
+        with pytest.raises(HTTPException) as error:
+            await limiter.hit("k")
+        return error.value, limiter.stats()
+
+    error, stats = asyncio.run(main())
+    assert error.status_code == 429
+    # 窗口还剩 40 秒
+    assert error.headers["Retry-After"] == "40"
+    assert stats == {"keys": 1, "allowed": 1, "rejected": 1}
+
+
+def test_dependencies_limit_by_ip_and_email(clock, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    app = FastAPI()
+    ip_limiter = RateLimiter("ip", 3, 60)
+    email_limiter = RateLimiter("email", 2, 60)
+
+    @app.get("/code", dependencies=[Depends(by_ip(ip_limiter)), Depends(by_email(email_limiter))])
+    async def code(email: str):
+        return {"ok": True}
+
+    client = TestClient(app)
+    statuses = [client.get("/code", params={"email": "A@x.com"}).status_code for _ in range(3)]
+    # 邮箱不区分大小写，第 3 次被按邮箱拦下
+    assert statuses == [200, 200, 429]
+    # 第 3 次在按 IP 的规则上已经算过了，换个邮箱也被按 IP 拦下
+    response = client.get("/code", params={"email": "b@x.com"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_dependencies_are_skipped_when_disabled(clock, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    app = FastAPI()
+    limiter = RateLimiter("ip", 1, 60)
+
+    @app.get("/ping", dependencies=[Depends(by_ip(limiter))])
+    async def ping():
+        return {"ok": True}
+
+    client = TestClient(app)
+    assert [client.get("/ping").status_code for _ in range(3)] == [200, 200, 200]
+    assert limiter.stats()["allowed"] == 0
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from cores.scheduler import LLMScheduler, TokenBucket
+
+
+def _scheduler(**kwargs) -> LLMScheduler:
+    options = {"max_concurrency": 1, "rate": 0, "burst": 1, "max_queue": 100, "max_queue_per_user": 100}
+    options.update(kwargs)
+    return LLMScheduler(**options)
+
+
+async def _occupy(scheduler: LLMScheduler) -> tuple[asyncio.Task, asyncio.Event]:
+    """占住唯一的名额，直到 release.set()"""
+    release = asyncio.Event()
+    task = asyncio.create_task(scheduler.run("holder", release.wait))
+    await asyncio.sleep(0)
+    assert scheduler.stats()["running"] == 1
+    return task, release
+
+
+def test_round_robin_between_users():
+    async def main():
+        scheduler = _scheduler()
+        holder, release = await _occupy(scheduler)
+        order = []
+
+        def call(label):
+            async def func():
+                order.append(label)
+            return func
+
+        # 用户 a 先排了 3 个，b 后排了 2 个，也不用等 a 全部跑完
+        tasks = [asyncio.create_task(scheduler.run("a", call(f"a{i}"))) for i in range(3)]
+        tasks += [asyncio.create_task(scheduler.run("b", call(f"b{i}"))) for i in range(2)]
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == 5
+        release.set()
+        await asyncio.gather(holder, *tasks)
+        return order
+
+    assert asyncio.run(main()) == ["a0", "b0", "a1", "b1", "a2"]
+
+
+def test_per_user_queue_limit_returns_429():
+    async def main():
+        scheduler = _scheduler(max_queue_per_user=1)
+        holder, release = await _occupy(scheduler)
+        queued = asyncio.create_task(scheduler.run(1, lambda: asyncio.sleep(0)))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as error:
+            await scheduler.run(1, lambda: asyncio.sleep(0))
+        # 别的用户不受影响
+        other = asyncio.create_task(scheduler.run(2, lambda: asyncio.sleep(0)))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == 2
+        release.set()
+        await asyncio.gather(holder, queued, other)
+        return error.value, scheduler.stats()
+
+    error, stats = asyncio.run(main())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 3
+
+
+def test_global_queue_limit_returns_503():
+    async def main():
+        scheduler = _scheduler(max_queue=1)
+        holder, release = await _occupy(scheduler)
+        queued = asyncio.create_task(scheduler.run(1, lambda: asyncio.sleep(0)))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as error:
+            await scheduler.run(2, lambda: asyncio.sleep(0))
+        release.set()
+        await asyncio.gather(holder, queued)
+        return error.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) >= 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        scheduler = _scheduler()
+        holder, release = await _occupy(scheduler)
+        waiter = asyncio.create_task(scheduler.run(1, lambda: asyncio.sleep(0)))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        stats = scheduler.stats()
+        release.set()
+        await holder
+        return stats, scheduler.stats()
+
+    while_waiting, after = asyncio.run(main())
+    assert while_waiting["queued"] == 0
+    assert while_waiting["users_waiting"] == 0
+    assert after["running"] == 0
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    # 桶空了，下一个令牌大约 0.1 秒后补上
+    assert 0 < bucket.try_acquire() <= 0.1
+
+
+def test_zero_rate_means_unlimited():
+    async def main():
+        scheduler = _scheduler(rate=0, burst=1, max_concurrency=4)
+        results = await asyncio.gather(*[scheduler.run(i % 2, lambda: asyncio.sleep(0, 1)) for i in range(20)])
+        # 有人排队时算 Retry-After，以前这里会除以 0
+        full = _scheduler(rate=0, max_queue=1)
+        holder, release = await _occupy(full)
+        queued = asyncio.create_task(full.run(1, lambda: asyncio.sleep(0)))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as error:
+            await full.run(2, lambda: asyncio.sleep(0))
+        release.set()
+        await asyncio.gather(holder, queued)
+        return results, error.value
+
+    results, error = asyncio.run(main())
+    assert results == [1] * 20
+    assert TokenBucket(rate=0, capacity=1).try_acquire() == 0
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) >= 1
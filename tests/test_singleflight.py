@@ -0,0 +1,103 @@
+import asyncio
+
+from cores.singleflight import SingleFlight
+
+
+class Call:
+    """可以手动结束的调用，记录被调用和被取消的次数"""
+
+    def __init__(self, result=None, error: Exception | None = None):
+        self.result = result
+        self.error = error
+        self.release = asyncio.Event()
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_callers_share_one_call():
+    async def main():
+        flight = SingleFlight()
+        call = Call(result="names")
+        tasks = [asyncio.create_task(flight.do("k", call)) for _ in range(3)]
+        await asyncio.sleep(0)
+        call.release.set()
+        return await asyncio.gather(*tasks), call, flight.stats()
+
+    results, call, stats = asyncio.run(main())
+    assert results == ["names"] * 3
+    assert call.started == 1
+    assert stats == {"calls": 1, "shared": 2, "abandoned": 0, "inflight": 0}
+
+
+def test_cancelled_leader_does_not_fail_followers():
+    async def main():
+        flight = SingleFlight()
+        call = Call(result="names")
+        leader = asyncio.create_task(flight.do("k", call))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", call))
+        await asyncio.sleep(0)
+        # leader 断开连接
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        assert flight.stats()["inflight"] == 1
+        call.release.set()
+        return leader, await follower, call, flight.stats()
+
+    leader, result, call, stats = asyncio.run(main())
+    assert leader.cancelled()
+    assert result == "names"
+    assert call.cancelled == 0
+    assert stats == {"calls": 1, "shared": 1, "abandoned": 0, "inflight": 0}
+
+
+def test_last_waiter_cancelling_cancels_the_call():
+    async def main():
+        flight = SingleFlight()
+        call = Call(result="names")
+        waiters = [asyncio.create_task(flight.do("k", call)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        abandoned = flight.stats()
+        # key 已经放掉，下一次是新的调用
+        retry = Call(result="again")
+        retry.release.set()
+        return call, abandoned, await flight.do("k", retry), flight.stats()
+
+    call, abandoned, result, stats = asyncio.run(main())
+    assert call.cancelled == 1
+    assert abandoned == {"calls": 1, "shared": 1, "abandoned": 1, "inflight": 0}
+    assert result == "again"
+    assert stats["calls"] == 2
+
+
+def test_exception_reaches_every_waiter():
+    async def main():
+        flight = SingleFlight()
+        call = Call(error=RuntimeError("model down"))
+        tasks = [asyncio.create_task(flight.do("k", call)) for _ in range(3)]
+        await asyncio.sleep(0)
+        call.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return results, call, flight.stats()
+
+    results, call, stats = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert call.started == 1
+    # 出错后 key 也要放掉，不能一直卡着后面的请求
+    assert stats == {"calls": 1, "shared": 2, "abandoned": 0, "inflight": 0}
+